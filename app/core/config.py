@@ -1,3 +1,50 @@
-SECRET_KEY = "your_secret_key_here"
+import os
+
+# Tokens are only trusted once SECRET_KEY comes from the environment; the
+# placeholder is public, so anyone could sign with it.
+DEFAULT_SECRET_KEY = "your_secret_key_here"
+SECRET_KEY = os.getenv("SECRET_KEY", DEFAULT_SECRET_KEY)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+GRAPHQL_MAX_DEPTH = 6
+GRAPHQL_MAX_COMPLEXITY = 10000
+GRAPHQL_DEFAULT_PAGE_SIZE = 20
+GRAPHQL_MAX_PAGE_SIZE = 100
+# Rows assumed for unpaginated child lists (an order's items, an item's parameters).
+GRAPHQL_NESTED_LIST_SIZE = 5
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+# Most rows a single batch mutation (createItems, updateOrderStatuses) may touch.
+GRAPHQL_MAX_BATCH_SIZE = 500
+GRAPHQL_PERSISTED_QUERY_CACHE_SIZE = 1000
+GRAPHQL_PERSISTED_QUERY_MAX_BYTES = 16 * 1024
+
+ORDER_READ_MODEL_ENABLED = False
+ORDER_READ_MODEL_BATCH_SIZE = 500
+
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_PER_SECOND = 20.0
+RATE_LIMIT_BURST = 40
+RATE_LIMIT_MAX_BUCKETS = 100_000
+# Concurrent requests allowed / queued per route class before shedding.
+ROUTE_CLASS_LIMITS = {
+    "cheap": {"concurrency": 32, "queue": 64},
+    "expensive": {"concurrency": 4, "queue": 8},
+    "write": {"concurrency": 16, "queue": 32},
+}
+LOAD_SHED_QUEUE_TIMEOUT_SECONDS = 2.0
+# Expensive reads are shed first once the DB pool is this full or latency this high.
+LOAD_SHED_POOL_USAGE = 0.8
+LOAD_SHED_LATENCY_SECONDS = 1.0
+LOAD_SHED_LATENCY_WINDOW_SECONDS = 5.0
+LOAD_SHED_RETRY_AFTER_SECONDS = 1
+
+COALESCE_MAX_WAITERS = 1000
+COALESCE_TIMEOUT_SECONDS = 5.0
+
+PROFILING_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILING_MAX_WINDOW_SECONDS = 300
+PROFILING_MAX_STORED_PROFILES = 50
+
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_CHUNK_BYTES = 64 * 1024
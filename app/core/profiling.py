@@ -0,0 +1,291 @@
+import asyncio
+import cProfile
+import contextvars
+import functools
+import io
+import itertools
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from app.core.config import (
+    PROFILING_MAX_STORED_PROFILES,
+    PROFILING_MAX_WINDOW_SECONDS,
+    PROFILING_SAMPLE_INTERVAL_SECONDS,
+)
+from app.core.security import is_admin_authorization
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Checked innermost frame first; the first match names the layer a sample
+# is charged to.
+LAYERS = (
+    ("db_wait", ("psycopg2", "sqlalchemy/pool/", "sqlalchemy/engine/default.py")),
+    ("orm_hydration", ("sqlalchemy/orm/",)),
+    ("sqlalchemy_core", ("sqlalchemy/",)),
+    ("pydantic_validation", ("pydantic/",)),
+    ("json_encoding", ("fastapi/encoders.py", "/json/", "starlette/responses.py")),
+)
+IDLE_FRAMES = ("threading.py", "queue.py", "selectors.py", "concurrent/futures/thread.py")
+
+# Before 3.12 cProfile hooks only the thread that enables it; from 3.12 it
+# uses sys.monitoring, which is process-wide and allows one profiler at a time.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+_request_profile: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+_sampled_request: contextvars.ContextVar = contextvars.ContextVar("sampled_request", default=False)
+_profile_lock = asyncio.Lock()
+
+
+def classify_stack(frames) -> str:
+    for frame in reversed(frames):
+        filename = frame.f_code.co_filename.replace("\\", "/")
+        for layer, patterns in LAYERS:
+            if any(pattern in filename for pattern in patterns):
+                return layer
+    return "app"
+
+
+def collapse(frame) -> Optional[str]:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    if not frames or frames[-1].f_code.co_filename.endswith(IDLE_FRAMES):
+        return None
+    names = [f"{f.f_code.co_name} ({f.f_code.co_filename.rsplit('/', 1)[-1]}:{f.f_lineno})" for f in frames]
+    return ";".join([classify_stack(frames)] + names)
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILING_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.route: Optional[str] = None
+        self.deadline: Optional[float] = None
+        self.remaining: Optional[int] = None
+        self.in_flight = 0
+        self.threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        return self.deadline is not None or bool(self.remaining) or self.in_flight > 0
+
+    def start(self, seconds: Optional[float] = None, route: Optional[str] = None, requests: Optional[int] = None):
+        with self._lock:
+            self.stacks.clear()
+            self.route = route
+            self.remaining = requests
+            self.deadline = None
+            if requests is None:
+                self.deadline = time.monotonic() + min(seconds or PROFILING_MAX_WINDOW_SECONDS, PROFILING_MAX_WINDOW_SECONDS)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.deadline = None
+            self.remaining = None
+
+    def request_started(self, path: str) -> bool:
+        with self._lock:
+            if not self.remaining or (self.route and not path.startswith(self.route)):
+                return False
+            self.remaining -= 1
+            self.in_flight += 1
+            return True
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def track_thread(self, thread_id: int):
+        with self._lock:
+            self.threads[thread_id] += 1
+
+    def untrack_thread(self, thread_id: int):
+        with self._lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def _sampled_threads(self):
+        # A time window samples every thread; request mode only the threads
+        # currently serving a matching request.
+        with self._lock:
+            if self.deadline is not None:
+                return None
+            return set(self.threads)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+            time.sleep(self.interval)
+            threads = self._sampled_threads()
+            if threads is not None and not threads:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (threads is not None and thread_id not in threads):
+                    continue
+                stack = collapse(frame)
+                if stack is not None:
+                    with self._lock:
+                        self.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        with self._lock:
+            layers: Counter = Counter()
+            for stack, count in self.stacks.items():
+                layers[stack.split(";", 1)[0]] += count
+            return {
+                "active": self.active,
+                "route": self.route,
+                "remaining_requests": self.remaining,
+                "samples": sum(layers.values()),
+                "layers": dict(layers),
+            }
+
+
+sampler = SamplingProfiler()
+request_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profile_ids = itertools.count(1)
+
+
+@contextmanager
+def tracked_thread():
+    # Marks the current thread as serving a sampled request for its duration.
+    if not _sampled_request.get():
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.track_thread(thread_id)
+    try:
+        yield
+    finally:
+        sampler.untrack_thread(thread_id)
+
+
+def in_request_thread(fn):
+    # For work a request hands to another thread (e.g. asyncio.to_thread),
+    # which inherits the request's context.
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with tracked_thread():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _profiled_call(call):
+    # Sync endpoints run in a worker thread: that thread is tracked for the
+    # sampler and, where cProfile is per-thread, gets its own profile.
+    if getattr(call, "__profiled__", False):
+        return call
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            with tracked_thread():
+                return await call(*args, **kwargs)
+        async_wrapper.__profiled__ = True
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        with tracked_thread():
+            profiles = _request_profile.get()
+            if profiles is None or not PER_THREAD_PROFILES:
+                return call(*args, **kwargs)
+            profile = cProfile.Profile()
+            profiles.append(profile)
+            profile.enable()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profile.disable()
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def wrap_routes(app):
+    # Routes added with their own route class (e.g. included routers).
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _profiled_call(route.dependant.call)
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependant.call = _profiled_call(self.dependant.call)
+
+
+def format_profiles(profiles) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(profiles[0], stream=output)
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.sort_stats("cumulative").print_stats(40)
+    return output.getvalue()
+
+
+def store_profile(profiles) -> str:
+    profile_id = str(next(_profile_ids))
+    request_profiles[profile_id] = format_profiles(profiles)
+    while len(request_profiles) > PROFILING_MAX_STORED_PROFILES:
+        request_profiles.popitem(last=False)
+    return profile_id
+
+
+def install(app):
+    app.router.route_class = ProfiledRoute
+
+    @app.middleware("http")
+    async def profile(request: Request, call_next):
+        sampled = sampler.request_started(request.url.path)
+        _sampled_request.set(sampled)
+        try:
+            if not (request.headers.get(PROFILE_HEADER) and is_admin_authorization(request.headers.get("authorization"))):
+                return await call_next(request)
+            # cProfile cannot run two profilers over the same thread (or, from
+            # 3.12, the same process), so profiled requests are serialized.
+            if _profile_lock.locked():
+                return JSONResponse(status_code=409, content={"detail": "Another profiled request is in progress"})
+            async with _profile_lock:
+                profiles = [cProfile.Profile()]
+                _request_profile.set(profiles)
+                # The event-loop side (routing, response validation and encoding)
+                # is profiled here and may include other requests interleaved on
+                # the loop; the endpoint body adds its own profile.
+                profiles[0].enable()
+                try:
+                    response = await call_next(request)
+                finally:
+                    profiles[0].disable()
+                response.headers[PROFILE_ID_HEADER] = store_profile(profiles)
+                return response
+        finally:
+            if sampled:
+                sampler.request_finished()
+
+    return app
@@ -1,7 +1,8 @@
+from fastapi import Header, HTTPException
 from passlib.context import CryptContext
-from jose import jwt
+from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from app.core.config import SECRET_KEY,ALGORITHM,ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import DEFAULT_SECRET_KEY,SECRET_KEY,ALGORITHM,ACCESS_TOKEN_EXPIRE_MINUTES
 
 pwd_context= CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -17,3 +18,26 @@ def create_access_token(data: dict, expire_delta:timedelta = None):
     to_encode.update({"exp":expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+
+def secret_key_configured():
+    return SECRET_KEY != DEFAULT_SECRET_KEY
+
+def decode_access_token(token: str):
+    if not secret_key_configured():
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def is_admin_authorization(authorization: str = None):
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    payload = decode_access_token(authorization[7:])
+    return bool(payload) and payload.get("role") == "admin"
+
+def require_admin(authorization: str = Header(None)):
+    if not secret_key_configured():
+        raise HTTPException(status_code=403, detail="Admin access is disabled until SECRET_KEY is set")
+    if not is_admin_authorization(authorization):
+        raise HTTPException(status_code=403, detail="Admin access required")
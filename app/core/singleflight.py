@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.core.config import COALESCE_MAX_WAITERS, COALESCE_TIMEOUT_SECONDS
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Concurrent calls with the same key wait on the first caller's fetch and
+    # share its result instead of each hitting the database.
+
+    def __init__(self, max_waiters: int = COALESCE_MAX_WAITERS, timeout: float = COALESCE_TIMEOUT_SECONDS):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.overflow = 0
+        self.timeouts = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            elif call.waiters >= self.max_waiters:
+                self.overflow += 1
+                call = None
+                leader = False
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if call is None:
+            return fn()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        elif not call.event.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out waiting for in-flight request {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "overflow": self.overflow,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._calls),
+                "collapse_ratio": requests / self.executed if self.executed else 0.0,
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    # Event-loop variant: waiters await the leader's future instead of blocking
+    # a thread, so it is safe to use from async endpoints and resolvers.
+
+    def __init__(self, max_waiters: int = COALESCE_MAX_WAITERS, timeout: float = COALESCE_TIMEOUT_SECONDS):
+        super().__init__(max_waiters, timeout)
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+            self._waiters[key] = 0
+            self.executed += 1
+            try:
+                result = await fn()
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # retrieved here so waiterless failures aren't logged twice
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                del self._calls[key]
+                del self._waiters[key]
+                if not future.done():
+                    # The leader was cancelled: wake the waiters so one of
+                    # them takes over instead of sitting out the timeout.
+                    future.cancel()
+
+        if self._waiters[key] >= self.max_waiters:
+            self.overflow += 1
+            return await fn()
+
+        self._waiters[key] += 1
+        self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out waiting for in-flight request {key!r}")
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+        finally:
+            if key in self._waiters:
+                self._waiters[key] -= 1
+        return await self.do(key, fn)
+
+
+reads = AsyncSingleFlight()
+graphql_reads = AsyncSingleFlight()
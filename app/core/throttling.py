@@ -0,0 +1,198 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from graphql import GraphQLSyntaxError, OperationDefinitionNode, OperationType, parse
+from app.core.config import (
+    LOAD_SHED_LATENCY_SECONDS,
+    LOAD_SHED_LATENCY_WINDOW_SECONDS,
+    LOAD_SHED_POOL_USAGE,
+    LOAD_SHED_QUEUE_TIMEOUT_SECONDS,
+    LOAD_SHED_RETRY_AFTER_SECONDS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_MAX_BUCKETS,
+    RATE_LIMIT_PER_SECOND,
+    ROUTE_CLASS_LIMITS,
+)
+from app.core.security import decode_access_token
+
+EXPENSIVE_LIST_PATHS = ("/orders", "/items", "/customers")
+
+
+class InMemoryTokenBucketStore:
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: int) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now, capacity / rate)
+            tokens, updated = self._buckets.pop(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (1 - tokens) / rate
+
+    def _evict(self, now: float, refill_seconds: float):
+        # Buckets are kept in last-used order. One idle long enough to refill
+        # is indistinguishable from a new one, so it can go; past max_buckets
+        # the least recently used go too.
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < refill_seconds and len(self._buckets) < self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SharedTokenBucketStore(InMemoryTokenBucketStore):
+    # Stand-in for a shared backend (e.g. Redis): one instance per process,
+    # shared by every app mounted in it, behind the same take() interface.
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            InMemoryTokenBucketStore.__init__(cls._instance, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class RouteClassLimiter:
+    def __init__(self, concurrency: int, queue: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queue = queue
+        self.waiting = 0
+        self.latency = 0.0
+        self.sampled_at = 0.0
+
+    def record(self, elapsed: float):
+        self.latency = 0.8 * self.latency + 0.2 * elapsed
+        self.sampled_at = time.monotonic()
+
+    def slow(self) -> bool:
+        # Stale samples are ignored so a shed class gets probed again.
+        recent = time.monotonic() - self.sampled_at < LOAD_SHED_LATENCY_WINDOW_SECONDS
+        return recent and self.latency >= LOAD_SHED_LATENCY_SECONDS
+
+
+@lru_cache(maxsize=256)
+def graphql_operation_type(query: str, operation_name: Optional[str]) -> Optional[OperationType]:
+    try:
+        document = parse(query)
+    except GraphQLSyntaxError:
+        return None
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode):
+            if operation_name is None or (definition.name and definition.name.value == operation_name):
+                return definition.operation
+    return None
+
+
+async def graphql_is_mutation(request: Request) -> bool:
+    if request.method == "GET":
+        query, operation_name = request.query_params.get("query"), request.query_params.get("operationName")
+    else:
+        try:
+            body = json.loads(await request.body() or b"{}")
+        except ValueError:
+            return False
+        if not isinstance(body, dict):
+            return False
+        query, operation_name = body.get("query"), body.get("operationName")
+    if not isinstance(query, str):
+        return False
+    return graphql_operation_type(query, operation_name) == OperationType.MUTATION
+
+
+async def classify(request: Request) -> str:
+    path = request.url.path
+    if path.startswith("/graphql"):
+        return "write" if await graphql_is_mutation(request) else "expensive"
+    if request.method not in ("GET", "HEAD"):
+        return "write"
+    if path.rstrip("/") in EXPENSIVE_LIST_PATHS:
+        return "expensive"
+    return "cheap"
+
+
+def client_key(request: Request) -> str:
+    # Only a verified token identifies a client; anything the caller can
+    # choose freely would let it mint a fresh bucket per request. Tokens are
+    # not verified at all while SECRET_KEY is the public default.
+    authorization = request.headers.get("authorization") or ""
+    if authorization.lower().startswith("bearer "):
+        payload = decode_access_token(authorization[7:])
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def pool_usage(engine) -> float:
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return 0.0
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    return pool.checkedout() / capacity if capacity else 0.0
+
+
+def reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def install(app, engine, store=None):
+    store = store or InMemoryTokenBucketStore()
+    limiters = {name: RouteClassLimiter(**limits) for name, limits in ROUTE_CLASS_LIMITS.items()}
+
+    @app.middleware("http")
+    async def throttle(request: Request, call_next):
+        if RATE_LIMIT_ENABLED:
+            allowed, retry_after = store.take(client_key(request), RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+            if not allowed:
+                return reject(429, "Rate limit exceeded", retry_after)
+
+        route_class = await classify(request)
+        limiter = limiters[route_class]
+
+        if route_class == "expensive" and (
+            pool_usage(engine) >= LOAD_SHED_POOL_USAGE or limiter.slow()
+        ):
+            return reject(503, "Server overloaded, retry later", LOAD_SHED_RETRY_AFTER_SECONDS)
+
+        if limiter.waiting >= limiter.queue:
+            return reject(503, "Server overloaded, retry later", LOAD_SHED_RETRY_AFTER_SECONDS)
+        limiter.waiting += 1
+        try:
+            await asyncio.wait_for(limiter.semaphore.acquire(), timeout=LOAD_SHED_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return reject(503, "Server overloaded, retry later", LOAD_SHED_RETRY_AFTER_SECONDS)
+        finally:
+            limiter.waiting -= 1
+
+        started = time.monotonic()
+        try:
+            return await call_next(request)
+        finally:
+            limiter.record(time.monotonic() - started)
+            limiter.semaphore.release()
+
+    return app
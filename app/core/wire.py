@@ -0,0 +1,243 @@
+import json
+import zlib
+from datetime import date, datetime
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from app import schema
+from app.core.config import COMPRESSION_CHUNK_BYTES, COMPRESSION_MIN_BYTES
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+JSON = "application/json"
+COMPACT_JSON = "application/vnd.compact+json"
+MSGPACK = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+
+AUDIT_FIELDS = frozenset(schema.CommonAuditFields.__fields__)
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def strip_audit(value):
+    if isinstance(value, list):
+        return [strip_audit(v) for v in value]
+    if isinstance(value, dict):
+        return {k: strip_audit(v) for k, v in value.items() if k not in AUDIT_FIELDS}
+    return value
+
+
+def _is_object_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and isinstance(value[0], dict)
+
+
+def columnar_columns(rows: List[dict]) -> list:
+    # Column header for the compact format. Nested lists of objects are
+    # described once as {"name": ..., "columns": [...]}, so their values can be
+    # plain arrays of arrays however many times they repeat.
+    columns: Dict[str, Optional[list]] = {}
+    for row in rows:
+        for key, value in row.items():
+            if _is_object_list(value):
+                if columns.get(key) is None:
+                    columns[key] = []
+                columns[key].extend(value)
+            else:
+                columns.setdefault(key, None)
+    return [
+        name if children is None else {"name": name, "columns": columnar_columns(children)}
+        for name, children in columns.items()
+    ]
+
+
+def columnar_row(row: dict, columns: list) -> list:
+    values = []
+    for column in columns:
+        if isinstance(column, dict):
+            children = row.get(column["name"]) or []
+            values.append([columnar_row(child, column["columns"]) for child in children])
+        else:
+            values.append(row.get(column))
+    return values
+
+
+def to_columnar(rows: List[dict]) -> dict:
+    columns = columnar_columns(rows)
+    return {"columns": columns, "rows": [columnar_row(row, columns) for row in rows]}
+
+
+def parse_header(value: str) -> Dict[str, float]:
+    # "a;q=0.5, b" -> {"a": 0.5, "b": 1.0}; entries with q=0 are refused.
+    preferences = {}
+    for entry in value.split(","):
+        token, *params = [part.strip() for part in entry.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        preferences[token.lower()] = q
+    return preferences
+
+
+def _best(offers: Iterable[str], quality) -> Optional[str]:
+    # Highest q wins; ties go to the earlier (server-preferred) offer.
+    best, best_q = None, 0.0
+    for offer in offers:
+        q = quality(offer)
+        if q > best_q:
+            best, best_q = offer, q
+    return best
+
+
+def _media_match(preferences: Dict[str, float], offer: str):
+    # (q, explicit) from the most specific range that matches the offer, so
+    # "application/json;q=0, */*" refuses JSON even though */* accepts it.
+    aliases = MSGPACK_ALIASES if offer == MSGPACK else (offer,)
+    explicit = [preferences[alias] for alias in aliases if alias in preferences]
+    if explicit:
+        return max(explicit), True
+    for media_range in ("application/*", "*/*"):
+        if media_range in preferences:
+            return preferences[media_range], False
+    return 0.0, False
+
+
+def choose_media_type(request: Request) -> str:
+    accept = request.headers.get("accept")
+    if not accept:
+        return JSON
+    preferences = parse_header(accept)
+    best, best_key = JSON, (0.0,)
+    for offer in ([MSGPACK] if msgpack is not None else []) + [COMPACT_JSON, JSON]:
+        q, explicit = _media_match(preferences, offer)
+        # Highest q, then explicit over wildcard matches, then server order;
+        # among wildcard matches plain JSON wins, so "*/*" keeps JSON.
+        key = (q, explicit, offer == JSON and not explicit)
+        if q > 0 and key > best_key:
+            best, best_key = offer, key
+    return best
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    accept_encoding = request.headers.get("accept-encoding")
+    if not accept_encoding:
+        return None
+    preferences = parse_header(accept_encoding)
+    wildcard = preferences.get("*", 0.0)
+    offers = (["zstd"] if zstandard is not None else []) + ["gzip"]
+    return _best(offers, lambda offer: preferences.get(offer, wildcard))
+
+
+def encode_chunks(rows: List[dict], media_type: str) -> Iterator[bytes]:
+    # Serializes one row at a time so the body is never held in memory whole.
+    if media_type == MSGPACK:
+        packer = msgpack.Packer(default=_default, use_bin_type=True)
+        yield packer.pack_array_header(len(rows))
+        for row in rows:
+            yield packer.pack(row)
+        return
+
+    if media_type == COMPACT_JSON:
+        columns = columnar_columns(rows)
+        yield b'{"columns":' + _dumps(columns) + b',"rows":['
+        for index, row in enumerate(rows):
+            yield (b"," if index else b"") + _dumps(columnar_row(row, columns))
+        yield b"]}"
+        return
+
+    yield b"["
+    for index, row in enumerate(rows):
+        yield (b"," if index else b"") + _dumps(row)
+    yield b"]"
+
+
+def encode(rows: List[dict], media_type: str) -> bytes:
+    return b"".join(encode_chunks(rows, media_type))
+
+
+def batched(chunks: Iterable[bytes], size: int = COMPRESSION_CHUNK_BYTES) -> Iterator[bytes]:
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def compressed_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def negotiated_response(request: Request, rows: Optional[List[dict]] = None, include_audit: bool = True,
+                        json_documents: Optional[List[str]] = None) -> Response:
+    # json_documents are already-serialized rows (e.g. from the order read
+    # model), passed through as-is when the client wants plain JSON with audit
+    # fields. Rows are encoded and compressed incrementally in
+    # COMPRESSION_CHUNK_BYTES batches; bodies that end up smaller than
+    # COMPRESSION_MIN_BYTES are sent as one uncompressed response.
+    media_type = choose_media_type(request)
+    if json_documents is not None and media_type == JSON and include_audit:
+        chunks = chain(
+            [b"["],
+            ((b"," if index else b"") + document.encode() for index, document in enumerate(json_documents)),
+            [b"]"],
+        )
+    else:
+        if rows is None:
+            rows = [json.loads(document) for document in json_documents]
+        if not include_audit:
+            rows = strip_audit(rows)
+        chunks = encode_chunks(rows, media_type)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    batches = batched(chunks, max(COMPRESSION_MIN_BYTES, 1))
+    first = next(batches, b"")
+    rest = next(batches, None)
+    if rest is None:
+        # Everything fit in the first batch: small enough to send directly.
+        encoding = choose_encoding(request)
+        if encoding is None or len(first) < COMPRESSION_MIN_BYTES:
+            return Response(content=first, media_type=media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(content=b"".join(compressed_chunks([first], encoding)), media_type=media_type, headers=headers)
+
+    body = batched(chain([first, rest], batches))
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return StreamingResponse(compressed_chunks(body, encoding), media_type=media_type, headers=headers)
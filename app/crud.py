@@ -1,15 +1,29 @@
+from sqlalchemy import bindparam, insert, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from app import models, schema
+from app import models, schema, read_model
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+def update_returning(db: Session, model, row_id: int, values: dict):
+    # One UPDATE ... RETURNING instead of SELECT, UPDATE and a refresh;
+    # returns None when the row does not exist.
+    stmt = (
+        update(model)
+        .where(model.id == row_id)
+        .values(**values, updated_at=models.utc_now())
+        .returning(model)
+    )
+    return db.execute(stmt).scalar_one_or_none()
 
 
 def create_customer(db: Session, customer: schema.CustomerCreate, audit: dict):
-    db_customer = models.Customer(**customer.dict(), **audit, created_at=datetime.utcnow(), updated_at=datetime.utcnow())
-    db.add(db_customer)
+    db_customer = db.execute(
+        insert(models.Customer).values(**customer.dict(), **audit).returning(models.Customer)
+    ).scalar_one()
+    set_committed_value(db_customer, "orders", [])
     db.commit()
-    db.refresh(db_customer)
     return db_customer
 
 
@@ -26,15 +40,10 @@ def get_customer_by_name(db: Session, name: str):
 
 
 def update_customer(db: Session, customer_id: int, updated_data: schema.CustomerUpdate):
-    db_customer = get_customer_by_id(db, customer_id)
+    db_customer = update_returning(db, models.Customer, customer_id, updated_data.dict(exclude_unset=True))
     if not db_customer:
         return None
-    update_data = updated_data.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_customer, key, value)
-    db_customer.updated_at = datetime.utcnow()
     db.commit()
-    db.refresh(db_customer)
     return db_customer
 
 
@@ -48,30 +57,30 @@ def delete_customer(db: Session, customer_id: int):
 
 
 def create_ordered_item(db: Session, item: schema.OrderedItemCreate, audit: dict):
-    db_item = models.OrderedItem(
-        item_name=item.item_name,
-        description=item.description,
-        price=item.price,
-        order_id=item.order_id,
-        **audit,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
-    )
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-
-    for param in item.parameters:
-        db_param = models.SubsectionParameter(
-            parameter_name=param.parameter_name,
-            item_id=db_item.id,
+    db_item = db.execute(
+        insert(models.OrderedItem)
+        .values(
+            item_name=item.item_name,
+            description=item.description,
+            price=item.price,
+            order_id=item.order_id,
             **audit,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
         )
-        db.add(db_param)
+        .returning(models.OrderedItem)
+    ).scalar_one()
+
+    params = []
+    if item.parameters:
+        params = db.scalars(
+            insert(models.SubsectionParameter).returning(models.SubsectionParameter),
+            [
+                {"parameter_name": param.parameter_name, "item_id": db_item.id, **audit}
+                for param in item.parameters
+            ],
+        ).all()
+    set_committed_value(db_item, "parameters", params)
+    read_model.mark_orders_stale(db, [db_item.order_id])
     db.commit()
-    db.refresh(db_item)
 
     return db_item
 
@@ -84,36 +93,104 @@ def get_item_by_id(db: Session, item_id: int):
     return db.query(models.OrderedItem).filter(models.OrderedItem.id == item_id).first()
 
 
-def update_item(db: Session, item_id: int, updated_item: schema.OrderedItemUpdate):
-    db_item = get_item_by_id(db, item_id)
-    if not db_item:
-        return None
+def diff_parameters(existing: list, desired_names: list):
+    # Match by name so unchanged rows keep their ids and audit fields; only
+    # the difference is inserted or deleted.
+    remaining = list(desired_names)
+    unchanged, deletes = [], []
+    for param in existing:
+        if param.parameter_name in remaining:
+            remaining.remove(param.parameter_name)
+            unchanged.append(param.id)
+        else:
+            deletes.append(param.id)
+    return remaining, deletes, unchanged
+
+
+def plan_parameter_patch(item_id: int, existing_ids: set, operations: list):
+    inserts, deletes, renames = [], [], {}
+    for operation in operations:
+        if operation.op == "add":
+            if operation.value is None:
+                raise ValueError("'add' requires a value")
+            inserts.append(operation.value.parameter_name)
+            continue
+
+        try:
+            param_id = int((operation.path or "").strip("/"))
+        except ValueError:
+            raise ValueError(f"Invalid parameter path: {operation.path!r}")
+        if param_id not in existing_ids or param_id in deletes:
+            raise ValueError(f"Parameter {param_id} not found on item {item_id}")
+
+        if operation.op == "remove":
+            deletes.append(param_id)
+            renames.pop(param_id, None)
+        else:
+            if operation.value is None:
+                raise ValueError("'replace' requires a value")
+            renames[param_id] = operation.value.parameter_name
+    return inserts, deletes, renames
+
+
+def apply_parameter_changes(db: Session, item_id: int, inserts: list, deletes: list, renames: dict, audit: dict):
+    table = models.SubsectionParameter.__table__
+    read_model.mark_items_stale(db, [item_id])
+    if deletes:
+        db.query(models.SubsectionParameter).filter(
+            models.SubsectionParameter.id.in_(deletes)
+        ).delete(synchronize_session=False)
+    if renames:
+        audit_values = {key: audit[key] for key in ("updated_by", "update_channel") if key in audit}
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("param_id"))
+            .values(parameter_name=bindparam("name"), updated_at=models.utc_now(), **audit_values),
+            [{"param_id": param_id, "name": name} for param_id, name in renames.items()],
+        )
+    if inserts:
+        db.execute(
+            insert(table),
+            [{"parameter_name": name, "item_id": item_id, **audit} for name in inserts],
+        )
 
+
+def update_item(db: Session, item_id: int, updated_item: schema.OrderedItemUpdate, audit: dict = None):
+    audit = audit or {}
     update_data = updated_item.dict(exclude_unset=True)
+    fields = {key: value for key, value in update_data.items() if key != "parameters"}
 
-    for key, value in update_data.items():
-        if key != "parameters":
-            setattr(db_item, key, value)
+    db_item = update_returning(db, models.OrderedItem, item_id, fields)
+    if not db_item:
+        return None
 
     if "parameters" in update_data and update_data["parameters"] is not None:
+        existing = db.query(models.SubsectionParameter).filter(
+            models.SubsectionParameter.item_id == item_id
+        ).all()
+        desired_names = [param["parameter_name"] for param in update_data["parameters"]]
+        inserts, deletes, _ = diff_parameters(existing, desired_names)
+        apply_parameter_changes(db, item_id, inserts, deletes, {}, audit)
 
-        db.query(models.SubsectionParameter).filter(
+    read_model.mark_orders_stale(db, [db_item.order_id])
+    db.commit()
+    return db_item
+
+
+def patch_item_parameters(db: Session, item_id: int, operations: list, audit: dict):
+    db_item = update_returning(db, models.OrderedItem, item_id, {})
+    if not db_item:
+        return None
+
+    existing_ids = {
+        param_id
+        for (param_id,) in db.query(models.SubsectionParameter.id).filter(
             models.SubsectionParameter.item_id == item_id
-        ).delete(synchronize_session=False)
-        db.flush() 
-
-        for param in update_data["parameters"]:
-            db_param = models.SubsectionParameter(
-                parameter_name=param["parameter_name"],
-                item_id=db_item.id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
-            db.add(db_param)
-
-    db_item.updated_at = datetime.utcnow()
+        )
+    }
+    inserts, deletes, renames = plan_parameter_patch(item_id, existing_ids, operations)
+    apply_parameter_changes(db, item_id, inserts, deletes, renames, audit)
     db.commit()
-    db.refresh(db_item)
     return db_item
 
 
@@ -127,16 +204,14 @@ def delete_item(db: Session, item_id: int):
 
 
 def create_order(db: Session, order: schema.OrderCreate, audit: dict):
-    db_order = models.Order(
-        customer_id=order.customer_id,
-        status=order.status,
-        **audit,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
-    )
-    db.add(db_order)
+    db_order = db.execute(
+        insert(models.Order)
+        .values(customer_id=order.customer_id, status=order.status, **audit)
+        .returning(models.Order)
+    ).scalar_one()
+    set_committed_value(db_order, "items", [])
+    read_model.mark_orders_stale(db, [db_order.id])
     db.commit()
-    db.refresh(db_order)
     return db_order
 
 
@@ -160,19 +235,22 @@ def get_order_by_id(db: Session, order_id: int):
         .first()
     )
 
-
-
-def update_order(db: Session, order_id: int, updated_order: schema.OrderUpdate):
-    db_order = get_order_by_id(db, order_id)
-    if not db_order:
-        return None
+def update_order(db: Session, order_id: int, updated_order: schema.OrderUpdate, audit: dict = None):
     update_data = updated_order.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_order, key, value)
-    db_order.updated_at = datetime.utcnow()
+    update_data.update({key: audit[key] for key in ("updated_by", "update_channel") if audit and key in audit})
+
+    updated_id = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id)
+        .values(**update_data, updated_at=models.utc_now())
+        .returning(models.Order.id)
+    ).scalar_one_or_none()
+    if updated_id is None:
+        return None
+    read_model.mark_orders_stale(db, [order_id])
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    # The response embeds items and parameters, so one joined read follows.
+    return get_order_by_id(db, order_id)
 
 
 def delete_order(db: Session, order_id: int):
@@ -0,0 +1,192 @@
+from typing import Optional
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNonNull,
+    InlineFragmentNode,
+    IntValueNode,
+    ListValueNode,
+    ObjectValueNode,
+    OperationDefinitionNode,
+    OperationType,
+    VariableNode,
+    get_named_type,
+)
+from strawberry.extensions import SchemaExtension
+from app.core.config import GRAPHQL_DEFAULT_PAGE_SIZE, GRAPHQL_MAX_PAGE_SIZE, GRAPHQL_NESTED_LIST_SIZE
+
+PAGE_SIZE_ARGUMENTS = ("first", "limit")
+
+
+def _argument_value(node, variables: dict, defaults: dict):
+    if isinstance(node, IntValueNode):
+        return int(node.value)
+    if isinstance(node, VariableNode):
+        name = node.name.value
+        return variables.get(name, defaults.get(name))
+    return None
+
+
+def _input_size(node, variables: dict, defaults: dict) -> int:
+    # Number of list elements anywhere in an argument, e.g. items plus each
+    # item's parameters, whether written inline or passed as variables.
+    if isinstance(node, VariableNode):
+        name = node.name.value
+        return _value_size(variables.get(name, defaults.get(name)))
+    if isinstance(node, ListValueNode):
+        return sum(1 + _input_size(value, variables, defaults) for value in node.values)
+    if isinstance(node, ObjectValueNode):
+        return sum(_input_size(field.value, variables, defaults) for field in node.fields)
+    return 0
+
+
+def _value_size(value) -> int:
+    if isinstance(value, list):
+        return sum(1 + _value_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_value_size(v) for v in value.values())
+    return 0
+
+
+def _input_rows(field: FieldNode, variables: dict, defaults: dict) -> Optional[int]:
+    # Length of the longest top-level list argument: a batch mutation returns
+    # one row per input element.
+    rows = None
+    for argument in field.arguments or []:
+        node = argument.value
+        if isinstance(node, VariableNode):
+            value = variables.get(node.name.value, defaults.get(node.name.value))
+            length = len(value) if isinstance(value, list) else None
+        else:
+            length = len(node.values) if isinstance(node, ListValueNode) else None
+        if length is not None:
+            rows = max(rows or 0, length)
+    return rows
+
+
+def _page_size(field: FieldNode, variables: dict, defaults: dict) -> Optional[int]:
+    # None means the field takes no page-size argument at all.
+    for argument in field.arguments or []:
+        if argument.name.value in PAGE_SIZE_ARGUMENTS:
+            value = _argument_value(argument.value, variables, defaults)
+            if not isinstance(value, int) or isinstance(value, bool):
+                # Missing or mistyped; variable coercion reports the latter.
+                return GRAPHQL_DEFAULT_PAGE_SIZE
+            return max(1, min(value, GRAPHQL_MAX_PAGE_SIZE))
+    return None
+
+
+def _takes_page_size(field_def) -> bool:
+    return any(name in field_def.args for name in PAGE_SIZE_ARGUMENTS)
+
+
+def _is_list(field_type) -> bool:
+    if isinstance(field_type, GraphQLNonNull):
+        field_type = field_type.of_type
+    return isinstance(field_type, GraphQLList)
+
+
+def selection_cost(selection_set, parent_type, fragments: dict, schema, variables: dict = None,
+                   defaults: dict = None, page_size: Optional[int] = None, visited=frozenset()) -> int:
+    # Every field costs 1 plus one per element of its list arguments; a list
+    # field's children are multiplied by the rows it can return: its own
+    # first/limit, the length of its input list, the first/limit of the
+    # connection it sits under (edges), or GRAPHQL_NESTED_LIST_SIZE.
+    variables = variables or {}
+    defaults = defaults or {}
+    total = 0
+    fields = getattr(parent_type, "fields", {}) or {}
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            field_def = fields.get(selection.name.value)
+            input_cost = sum(
+                _input_size(argument.value, variables, defaults) for argument in selection.arguments or []
+            )
+            if selection.selection_set is None or field_def is None:
+                total += 1 + input_cost
+                continue
+            requested = _page_size(selection, variables, defaults)
+            if requested is None and _takes_page_size(field_def):
+                requested = GRAPHQL_DEFAULT_PAGE_SIZE
+            if _is_list(field_def.type):
+                multiplier = (
+                    requested or _input_rows(selection, variables, defaults) or page_size or GRAPHQL_NESTED_LIST_SIZE
+                )
+                child_page_size = None
+            else:
+                multiplier = 1
+                child_page_size = requested
+            child_cost = selection_cost(
+                selection.selection_set, get_named_type(field_def.type), fragments, schema,
+                variables, defaults, child_page_size, visited,
+            )
+            total += 1 + input_cost + multiplier * child_cost
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in visited:
+                continue
+            fragment_type = schema.get_type(fragment.type_condition.name.value)
+            total += selection_cost(
+                fragment.selection_set, fragment_type, fragments, schema,
+                variables, defaults, page_size, visited | {name},
+            )
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = (
+                schema.get_type(selection.type_condition.name.value)
+                if selection.type_condition
+                else parent_type
+            )
+            total += selection_cost(
+                selection.selection_set, fragment_type, fragments, schema,
+                variables, defaults, page_size, visited,
+            )
+    return total
+
+
+def operation_cost(document, schema, variables: dict = None, operation_name: str = None) -> int:
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    for definition in document.definitions:
+        if not isinstance(definition, OperationDefinitionNode):
+            continue
+        if operation_name and (definition.name is None or definition.name.value != operation_name):
+            continue
+        root_type = {
+            OperationType.QUERY: schema.query_type,
+            OperationType.MUTATION: schema.mutation_type,
+            OperationType.SUBSCRIPTION: schema.subscription_type,
+        }[definition.operation]
+        defaults = {
+            variable.variable.name.value: _argument_value(variable.default_value, {}, {})
+            for variable in definition.variable_definitions or []
+            if variable.default_value is not None
+        }
+        return selection_cost(definition.selection_set, root_type, fragments, schema, variables, defaults)
+    return 0
+
+
+class QueryComplexityLimiter(SchemaExtension):
+    # Runs after parsing/validation (both cached per document) because the
+    # cost depends on the request's variables.
+
+    def __init__(self, max_complexity: int):
+        self.max_complexity = max_complexity
+
+    def on_execute(self):
+        context = self.execution_context
+        if context.graphql_document is not None:
+            cost = operation_cost(
+                context.graphql_document, context.schema._schema, context.variables, context.operation_name
+            )
+            if cost > self.max_complexity:
+                raise GraphQLError(
+                    f"Operation exceeds maximum complexity of {self.max_complexity} (cost {cost})"
+                )
+        yield
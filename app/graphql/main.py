@@ -1,8 +1,97 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
 from fastapi import FastAPI
+from pydantic import BaseModel
 from strawberry.fastapi import GraphQLRouter
+from app.core import profiling, throttling
+from app.core.config import GRAPHQL_PERSISTED_QUERY_CACHE_SIZE, GRAPHQL_PERSISTED_QUERY_MAX_BYTES
+from app.database import engine
 from .schema import schema_graphql  
 
 app = FastAPI()
+profiling.install(app)
+throttling.install(app, engine, throttling.SharedTokenBucketStore())
 # Create a GraphQL router instance using our schema
 graphql_app = GraphQLRouter(schema_graphql)
 app.include_router(graphql_app, prefix="/graphql")
+profiling.wrap_routes(app)
+
+# Automatic persisted queries: clients send only the sha256 of the query text.
+# On a miss they get PersistedQueryNotFound and resend hash + query, which is
+# verified and kept in a bounded per-process LRU. The schema's
+# ParserCache/ValidationCache then skip re-parsing the stored text.
+
+
+class PersistedQueryCache:
+    def __init__(self, maxsize: int = GRAPHQL_PERSISTED_QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._queries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query_hash: str) -> Optional[str]:
+        with self._lock:
+            query = self._queries.get(query_hash)
+            if query is not None:
+                self._queries.move_to_end(query_hash)
+            return query
+
+    def put(self, query_hash: str, query: str):
+        with self._lock:
+            self._queries[query_hash] = query
+            self._queries.move_to_end(query_hash)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._queries)
+
+
+persisted_queries = PersistedQueryCache()
+
+
+class PersistedQueryRequest(BaseModel):
+    query: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
+    operationName: Optional[str] = None
+    extensions: Dict[str, Any]
+
+
+def error_response(message: str, code: str):
+    return {"data": None, "errors": [{"message": message, "extensions": {"code": code}}]}
+
+
+def resolve_persisted_query(body: PersistedQueryRequest):
+    persisted = (body.extensions or {}).get("persistedQuery") or {}
+    query_hash = persisted.get("sha256Hash")
+    if persisted.get("version") != 1 or not isinstance(query_hash, str):
+        return None, error_response("Unsupported persisted query", "PERSISTED_QUERY_NOT_SUPPORTED")
+
+    if body.query is None:
+        query = persisted_queries.get(query_hash)
+        if query is None:
+            return None, error_response("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        return query, None
+
+    if len(body.query.encode()) > GRAPHQL_PERSISTED_QUERY_MAX_BYTES:
+        return None, error_response("Persisted query too large", "PERSISTED_QUERY_TOO_LARGE")
+    if hashlib.sha256(body.query.encode()).hexdigest() != query_hash:
+        return None, error_response("provided sha does not match query", "INVALID_PERSISTED_QUERY_HASH")
+    persisted_queries.put(query_hash, body.query)
+    return body.query, None
+
+
+@app.post("/graphql/persisted")
+async def execute_persisted_query(body: PersistedQueryRequest):
+    query, error = resolve_persisted_query(body)
+    if error is not None:
+        return error
+
+    result = await schema_graphql.execute(
+        query, variable_values=body.variables, operation_name=body.operationName
+    )
+    response: Dict[str, Any] = {"data": result.data}
+    if result.errors:
+        response["errors"] = [error.formatted for error in result.errors]
+    return response
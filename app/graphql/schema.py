@@ -1,6 +1,21 @@
+import asyncio
+import base64
 import strawberry
+from datetime import datetime
 from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
+from strawberry.extensions import ParserCache, QueryDepthLimiter, ValidationCache
+from app.core.config import (
+    GRAPHQL_DEFAULT_PAGE_SIZE,
+    GRAPHQL_DOCUMENT_CACHE_SIZE,
+    GRAPHQL_MAX_BATCH_SIZE,
+    GRAPHQL_MAX_COMPLEXITY,
+    GRAPHQL_MAX_DEPTH,
+    GRAPHQL_MAX_PAGE_SIZE,
+)
+from app import crud, read_model
+from app.core import profiling, singleflight
+from app.graphql.complexity import QueryComplexityLimiter
 from app.main import get_db
 from app.models import Customer, Order, OrderedItem, SubsectionParameter
 
@@ -32,6 +47,31 @@ class CustomerType:
     contact_no: Optional[str]
     orders: List[OrderType]
 
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str]
+
+@strawberry.type
+class OrderEdge:
+    cursor: str
+    node: OrderType
+
+@strawberry.type
+class OrderConnection:
+    edges: List[OrderEdge]
+    page_info: PageInfo
+
+@strawberry.type
+class CustomerEdge:
+    cursor: str
+    node: CustomerType
+
+@strawberry.type
+class CustomerConnection:
+    edges: List[CustomerEdge]
+    page_info: PageInfo
+
 @strawberry.input
 class SubsectionParameterInput:
     parameter_name: str
@@ -56,6 +96,11 @@ class OrderInput:
     status: str
     customer_id: int
 
+@strawberry.input
+class OrderStatusInput:
+    order_id: int
+    status: str
+
 @strawberry.input
 class OrderUpdateInput:  
     status: Optional[str] = None
@@ -78,49 +123,180 @@ def get_db_session():
     db: Session = next(db_gen)
     return db, db_gen
 
+def page_size(requested: Optional[int]) -> int:
+    if requested is None:
+        return GRAPHQL_DEFAULT_PAGE_SIZE
+    return max(1, min(requested, GRAPHQL_MAX_PAGE_SIZE))
+
+def encode_cursor(kind: str, id: int) -> str:
+    return base64.urlsafe_b64encode(f"{kind}:{id}".encode()).decode()
+
+def decode_cursor(kind: str, cursor: str) -> int:
+    try:
+        prefix, id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        if prefix != kind:
+            raise ValueError
+        return int(id)
+    except ValueError:
+        raise ValueError(f"Invalid {kind} cursor")
+
+def paginate(query, model, kind: str, first: Optional[int], after: Optional[str]):
+    # Keyset pagination on the primary key; one extra row tells us whether
+    # another page exists without a COUNT query.
+    limit = page_size(first)
+    if after is not None:
+        query = query.filter(model.id > decode_cursor(kind, after))
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    has_next_page = len(rows) > limit
+    rows = rows[:limit]
+    edges = [(encode_cursor(kind, row.id), row) for row in rows]
+    page_info = PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+    return edges, page_info
+
+# Coalesced lookups share plain rows between requests, never ORM instances;
+# each request builds its own strawberry objects from them.
+
+def parameter_row(param: SubsectionParameter) -> dict:
+    return {"id": param.id, "parameter_name": param.parameter_name}
+
+def item_row(item: OrderedItem) -> dict:
+    return {
+        "id": item.id,
+        "item_name": item.item_name,
+        "description": item.description,
+        "price": item.price,
+        "parameters": [parameter_row(param) for param in item.parameters],
+    }
+
+def order_row(order: Order) -> dict:
+    return {
+        "id": order.id,
+        "status": order.status,
+        "customer_id": order.customer_id,
+        "items": [item_row(item) for item in order.items],
+    }
+
+def customer_row(customer: Customer) -> dict:
+    return {
+        "id": customer.id,
+        "name": customer.name,
+        "email": customer.email,
+        "contact_no": customer.contact_no,
+        "orders": [order_row(order) for order in customer.orders],
+    }
+
+def item_type(row: dict) -> OrderedItemType:
+    return OrderedItemType(**{**row, "parameters": [SubsectionParameterType(**param) for param in row["parameters"]]})
+
+def order_type(row: dict) -> OrderType:
+    return OrderType(**{**row, "items": [item_type(item) for item in row["items"]]})
+
+def customer_type(row: dict) -> CustomerType:
+    return CustomerType(**{**row, "orders": [order_type(order) for order in row["orders"]]})
+
+def fetch_orders(id: Optional[int], limit: Optional[int]) -> List[dict]:
+    db, db_gen = get_db_session()
+    try:
+        query = db.query(Order).options(
+            joinedload(Order.items).joinedload(OrderedItem.parameters)
+        )
+        if id is not None:
+            orders = query.filter(Order.id == id).all()
+        else:
+            orders = query.order_by(Order.id).limit(page_size(limit)).all()
+        return [order_row(order) for order in orders]
+    finally:
+        db_gen.close()
+
+def fetch_customers(id: Optional[int], limit: Optional[int]) -> List[dict]:
+    db, db_gen = get_db_session()
+    try:
+        query = db.query(Customer).options(
+            joinedload(Customer.orders)
+            .joinedload(Order.items)
+            .joinedload(OrderedItem.parameters)
+        )
+        if id is not None:
+            customers = query.filter(Customer.id == id).all()
+        else:
+            customers = query.order_by(Customer.id).limit(page_size(limit)).all()
+        return [customer_row(customer) for customer in customers]
+    finally:
+        db_gen.close()
+
 @strawberry.type
 class Query:
     @strawberry.field
-    def customers(self, id: Optional[int] = None) -> List[CustomerType]:
+    async def customers(self, id: Optional[int] = None, limit: Optional[int] = None) -> List[CustomerType]:
+        if id is not None:
+            rows = await singleflight.graphql_reads.do(
+                ("graphql:customer", id),
+                lambda: asyncio.to_thread(profiling.in_request_thread(fetch_customers), id, None),
+            )
+        else:
+            rows = await asyncio.to_thread(profiling.in_request_thread(fetch_customers), None, limit)
+        return [customer_type(row) for row in rows]
+
+    @strawberry.field
+    async def orders(self, id: Optional[int] = None, limit: Optional[int] = None) -> List[OrderType]:
+        if id is not None:
+            rows = await singleflight.graphql_reads.do(
+                ("graphql:order", id),
+                lambda: asyncio.to_thread(profiling.in_request_thread(fetch_orders), id, None),
+            )
+        else:
+            rows = await asyncio.to_thread(profiling.in_request_thread(fetch_orders), None, limit)
+        return [order_type(row) for row in rows]
+
+    @strawberry.field
+    def items(self, id: Optional[int] = None, limit: Optional[int] = None) -> List[OrderedItemType]:
         db, db_gen = get_db_session()
         try:
-            query = db.query(Customer).options(
-                joinedload(Customer.orders)
-                .joinedload(Order.items)
-                .joinedload(OrderedItem.parameters)
+            query = db.query(OrderedItem).options(
+                joinedload(OrderedItem.parameters)
             )
             if id is not None:
-                return query.filter(Customer.id == id).all()
-            return query.all()
+                return query.filter(OrderedItem.id == id).all()
+            return query.order_by(OrderedItem.id).limit(page_size(limit)).all()
         finally:
             db_gen.close()
 
     @strawberry.field
-    def orders(self, id: Optional[int] = None) -> List[OrderType]:
+    def orders_connection(self, first: Optional[int] = None, after: Optional[str] = None) -> OrderConnection:
         db, db_gen = get_db_session()
         try:
             query = db.query(Order).options(
                 joinedload(Order.items).joinedload(OrderedItem.parameters)
             )
-            if id is not None:
-                return query.filter(Order.id == id).all()
-            return query.all()
+            edges, page_info = paginate(query, Order, "Order", first, after)
+            return OrderConnection(
+                edges=[OrderEdge(cursor=cursor, node=node) for cursor, node in edges],
+                page_info=page_info,
+            )
         finally:
             db_gen.close()
 
     @strawberry.field
-    def items(self, id: Optional[int] = None) -> List[OrderedItemType]:
+    def customers_connection(self, first: Optional[int] = None, after: Optional[str] = None) -> CustomerConnection:
         db, db_gen = get_db_session()
         try:
-            query = db.query(OrderedItem).options(
-                joinedload(OrderedItem.parameters)
+            query = db.query(Customer).options(
+                joinedload(Customer.orders)
+                .joinedload(Order.items)
+                .joinedload(OrderedItem.parameters)
+            )
+            edges, page_info = paginate(query, Customer, "Customer", first, after)
+            return CustomerConnection(
+                edges=[CustomerEdge(cursor=cursor, node=node) for cursor, node in edges],
+                page_info=page_info,
             )
-            if id is not None:
-                return query.filter(OrderedItem.id == id).all()
-            return query.all()
         finally:
             db_gen.close()
 
+def check_batch_size(kind: str, count: int):
+    if count > GRAPHQL_MAX_BATCH_SIZE:
+        raise ValueError(f"At most {GRAPHQL_MAX_BATCH_SIZE} {kind} per request")
+
 @strawberry.type
 class Mutation:
     @strawberry.mutation
@@ -223,9 +399,9 @@ class Mutation:
                     setattr(db_item, key, value)
 
             if item.parameters is not None:
-                db.query(SubsectionParameter).filter(SubsectionParameter.item_id == item_id).delete()
-                for param in item.parameters:
-                    db.add(SubsectionParameter(parameter_name=param.parameter_name, item_id=item_id))
+                desired_names = [param.parameter_name for param in item.parameters]
+                inserts, deletes, _ = crud.diff_parameters(db_item.parameters, desired_names)
+                crud.apply_parameter_changes(db, item_id, inserts, deletes, {}, {})
 
             db.commit()
             db.refresh(db_item)
@@ -233,6 +409,74 @@ class Mutation:
         finally:
             db_gen.close()
 
+    @strawberry.mutation
+    def create_items(self, items: List[OrderedItemInput]) -> List[OrderedItemType]:
+        check_batch_size("items", len(items))
+        db, db_gen = get_db_session()
+        try:
+            new_items = [
+                OrderedItem(
+                    item_name=item.item_name,
+                    description=item.description,
+                    price=item.price,
+                    order_id=item.order_id,
+                )
+                for item in items
+            ]
+            db.add_all(new_items)
+            db.flush()
+
+            db.add_all([
+                SubsectionParameter(parameter_name=param.parameter_name, item_id=new_item.id)
+                for item, new_item in zip(items, new_items)
+                for param in item.parameters or []
+            ])
+            db.commit()
+
+            item_ids = [new_item.id for new_item in new_items]
+            return (
+                db.query(OrderedItem)
+                .options(joinedload(OrderedItem.parameters))
+                .filter(OrderedItem.id.in_(item_ids))
+                .order_by(OrderedItem.id)
+                .all()
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db_gen.close()
+
+    @strawberry.mutation
+    def update_order_statuses(self, updates: List[OrderStatusInput]) -> List[OrderType]:
+        check_batch_size("updates", len(updates))
+        db, db_gen = get_db_session()
+        try:
+            requested = {update.order_id: update.status for update in updates}
+            existing_ids = [
+                order_id for (order_id,) in db.query(Order.id).filter(Order.id.in_(requested.keys()))
+            ]
+            now = datetime.utcnow()
+            read_model.mark_orders_stale(db, existing_ids)
+            db.bulk_update_mappings(Order, [
+                {"id": order_id, "status": requested[order_id], "updated_at": now}
+                for order_id in existing_ids
+            ])
+            db.commit()
+
+            return (
+                db.query(Order)
+                .options(joinedload(Order.items).joinedload(OrderedItem.parameters))
+                .filter(Order.id.in_(existing_ids))
+                .order_by(Order.id)
+                .all()
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db_gen.close()
+
     @strawberry.mutation
     def delete_customer(self, customer_id: int) -> bool:
         db, db_gen = get_db_session()
@@ -272,4 +516,13 @@ class Mutation:
         finally:
             db_gen.close()
 
-schema_graphql = strawberry.Schema(query=Query, mutation=Mutation)
+schema_graphql = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    extensions=[
+        QueryDepthLimiter(max_depth=GRAPHQL_MAX_DEPTH),
+        QueryComplexityLimiter(max_complexity=GRAPHQL_MAX_COMPLEXITY),
+        ParserCache(maxsize=GRAPHQL_DOCUMENT_CACHE_SIZE),
+        ValidationCache(maxsize=GRAPHQL_DOCUMENT_CACHE_SIZE),
+    ],
+)
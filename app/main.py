@@ -1,13 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException, Response
+import asyncio
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 
-from app import models, schema, crud
+from app import models, schema, crud, read_model, schema_upgrade
+from app.core import profiling, singleflight, throttling, wire
+from app.core.security import require_admin
+from app.core.config import ORDER_READ_MODEL_ENABLED
 from app.database import SessionLocal, engine, Base
 
 Base.metadata.create_all(bind=engine)
+# Only ALTERs columns still missing their default; backfilling NULL rows is
+# left to the CLI.
+schema_upgrade.apply_audit_defaults(engine, backfill=False)
+if not ORDER_READ_MODEL_ENABLED:
+    with SessionLocal() as session:
+        read_model.invalidate(session)
 
 app = FastAPI(title="Order Management API", version="1.0.0")
+profiling.install(app)
+throttling.install(app, engine, throttling.SharedTokenBucketStore())
 
 
 def get_db():
@@ -18,6 +32,19 @@ def get_db():
         db.close()
 
 
+async def coalesced_read(key, fetch):
+    # Waiters await on the event loop; only the leader's fetch takes a worker
+    # thread, so a herd on one key cannot exhaust the threadpool.
+    try:
+        return await singleflight.reads.do(key, lambda: asyncio.to_thread(profiling.in_request_thread(fetch)))
+    except singleflight.SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+def is_foreign_key_violation(e: IntegrityError):
+    return getattr(e.orig, "pgcode", None) == "23503"
+
+
 def get_audit():
     return {
         "created_by": "admin",
@@ -27,22 +54,62 @@ def get_audit():
     }
 
 
+@app.get("/metrics/coalescing")
+def coalescing_stats():
+    return {"rest": singleflight.reads.stats(), "graphql": singleflight.graphql_reads.stats()}
+
+
+@app.post("/admin/profiling/start", dependencies=[Depends(require_admin)])
+def start_profiling(options: schema.ProfilingStart):
+    profiling.sampler.start(seconds=options.seconds, route=options.route, requests=options.requests)
+    return profiling.sampler.summary()
+
+
+@app.post("/admin/profiling/stop", dependencies=[Depends(require_admin)])
+def stop_profiling():
+    profiling.sampler.stop()
+    return profiling.sampler.summary()
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def profiling_summary():
+    return profiling.sampler.summary()
+
+
+@app.get("/admin/profiling/stacks", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def profiling_stacks():
+    return profiling.sampler.collapsed()
+
+
+@app.get("/admin/profiling/requests/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def request_profile(profile_id: str):
+    output = profiling.request_profiles.get(profile_id)
+    if output is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return output
+
+
 @app.post("/customers", response_model=schema.Customer)
 def create_customer(customer: schema.CustomerCreate, db: Session = Depends(get_db)):
     return crud.create_customer(db, customer, get_audit())
 
 
 @app.get("/customers", response_model=List[schema.CustomerBase])
-def list_customers(db: Session = Depends(get_db)):
-    return crud.get_customers(db)
+def list_customers(request: Request, db: Session = Depends(get_db)):
+    rows = [schema.from_orm(schema.CustomerBase, customer).dict() for customer in crud.get_customers(db)]
+    return wire.negotiated_response(request, rows)
 
 
 @app.get("/customer/{customer_id}", response_model=schema.Customer)
-def get_customer_basic(customer_id: int, db: Session = Depends(get_db)):
-    customer = crud.get_customer_by_id(db, customer_id)
-    if not customer:
+async def get_customer_basic(customer_id: int, db: Session = Depends(get_db)):
+    def fetch():
+        customer = crud.get_customer_by_id(db, customer_id)
+        return schema.from_orm(schema.Customer, customer).json() if customer else None
+
+    document = await coalesced_read(("customer", customer_id), fetch)
+    if document is None:
         raise HTTPException(status_code=404, detail="Customer not found")
-    return customer
+    return Response(content=document, media_type="application/json")
 
 
 @app.get("/customers/by-name/{customer_name}", response_model=schema.Customer)
@@ -70,32 +137,51 @@ def delete_customer(customer_id: int, db: Session = Depends(get_db)):
 
 @app.post("/orders", response_model=schema.Order)
 def create_order(order: schema.OrderCreate, db: Session = Depends(get_db)):
-    customer = crud.get_customer_by_id(db, order.customer_id)
-    if not customer:
-        raise HTTPException(status_code=400, detail="Invalid customer_id")
-    
     try:
         return crud.create_order(db=db, order=order, audit=get_audit())
+    except IntegrityError as e:
+        db.rollback()
+        if is_foreign_key_violation(e):
+            raise HTTPException(status_code=400, detail="Invalid customer_id")
+        raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
 
 @app.get("/orders", response_model=List[schema.Order])
-def list_orders(db: Session = Depends(get_db)):
-    return crud.get_orders(db)
+def list_orders(request: Request, audit: bool = True, db: Session = Depends(get_db)):
+    if ORDER_READ_MODEL_ENABLED and read_model.is_ready(db):
+        documents = read_model.get_order_documents(db)
+        return wire.negotiated_response(request, include_audit=audit, json_documents=documents)
+    rows = [schema.from_orm(schema.Order, order).dict() for order in crud.get_orders(db)]
+    return wire.negotiated_response(request, rows, include_audit=audit)
 
 
 @app.get("/orders/{order_id}", response_model=schema.Order)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = crud.get_order_by_id(db, order_id)
-    if not order:
+async def get_order(order_id: int, db: Session = Depends(get_db)):
+    def fetch():
+        if ORDER_READ_MODEL_ENABLED and read_model.is_ready(db):
+            document = read_model.get_order_document(db, order_id)
+            if document is not None:
+                return document
+        order = crud.get_order_by_id(db, order_id)
+        return schema.from_orm(schema.Order, order).json() if order else None
+
+    document = await coalesced_read(("order", order_id), fetch)
+    if document is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
+    return Response(content=document, media_type="application/json")
 
 
 @app.put("/orders/{order_id}", response_model=schema.Order)
 def update_order(order_id: int, updated_order: schema.OrderUpdate, db: Session = Depends(get_db)):  # CHANGED to OrderUpdate
-    order = crud.update_order(db, order_id, updated_order)
+    try:
+        order = crud.update_order(db, order_id, updated_order, get_audit())
+    except IntegrityError as e:
+        db.rollback()
+        if is_foreign_key_violation(e):
+            raise HTTPException(status_code=400, detail="Invalid customer_id")
+        raise
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
@@ -103,16 +189,9 @@ def update_order(order_id: int, updated_order: schema.OrderUpdate, db: Session =
 
 @app.put("/orders/{order_id}/status", response_model=schema.Order)
 def update_order_status(order_id: int, status_update: schema.OrderStatusUpdate, db: Session = Depends(get_db)):
-    order = crud.get_order_by_id(db, order_id)
+    order = crud.update_order(db, order_id, schema.OrderUpdate(status=status_update.status), get_audit())
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-
-    order.status = status_update.status
-    for k, v in get_audit().items():
-        setattr(order, k, v)
-    db.commit()
-    db.refresh(order)
-
     return order
 
 
@@ -128,14 +207,20 @@ def delete_order(order_id: int, db: Session = Depends(get_db)):
 def create_item(item: schema.OrderedItemCreate, db: Session = Depends(get_db)):
     try:
         return crud.create_ordered_item(db=db, item=item, audit=get_audit())
+    except IntegrityError as e:
+        db.rollback()
+        if is_foreign_key_violation(e):
+            raise HTTPException(status_code=400, detail="Invalid order_id")
+        raise HTTPException(status_code=500, detail=f"Failed to create item: {str(e)}")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create item: {str(e)}")
 
 
 @app.get("/items", response_model=List[schema.OrderedItem])
-def list_items(db: Session = Depends(get_db)):
-    return crud.get_items(db)
+def list_items(request: Request, audit: bool = True, db: Session = Depends(get_db)):
+    rows = [schema.from_orm(schema.OrderedItem, item).dict() for item in crud.get_items(db)]
+    return wire.negotiated_response(request, rows, include_audit=audit)
 
 
 @app.get("/items/{item_id}", response_model=schema.OrderedItem)
@@ -148,7 +233,19 @@ def get_item(item_id: int, db: Session = Depends(get_db)):
 
 @app.put("/items/{item_id}", response_model=schema.OrderedItem)
 def update_item(item_id: int, updated_item: schema.OrderedItemUpdate, db: Session = Depends(get_db)):  
-    item = crud.update_item(db, item_id, updated_item)
+    item = crud.update_item(db, item_id, updated_item, get_audit())
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+@app.patch("/items/{item_id}/parameters", response_model=schema.OrderedItem)
+def patch_item_parameters(item_id: int, operations: List[schema.ParameterPatchOperation], db: Session = Depends(get_db)):
+    try:
+        item = crud.patch_item_parameters(db, item_id, operations, get_audit())
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
@@ -1,12 +1,21 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Text, func, text
 from sqlalchemy.orm import relationship, declarative_mixin
 from datetime import datetime
 from app.database import Base
 
+
+def utc_now():
+    return func.timezone("utc", func.now())
+
+
 @declarative_mixin
 class CommonBase:
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps are filled in by the database and fetched with RETURNING,
+    # so writes need no Python-side clock or follow-up SELECT.
+    __mapper_args__ = {"eager_defaults": True}
+
+    created_at = Column(DateTime, server_default=text("timezone('utc', now())"))
+    updated_at = Column(DateTime, server_default=text("timezone('utc', now())"), onupdate=utc_now())
     creation_channel = Column(String, default="web")
     update_channel = Column(String, default="web")
     created_by = Column(String, default="system")
@@ -58,3 +67,20 @@ class SubsectionParameter(Base, CommonBase):
     item_id = Column(BigInteger, ForeignKey("ordered_items.id"), nullable=False)
 
     item = relationship("OrderedItem", back_populates="parameters")
+
+
+class OrderReadModel(Base):
+    __tablename__ = "order_read_models"
+
+    order_id = Column(BigInteger, ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True)
+    customer_id = Column(BigInteger, index=True, nullable=False)
+    document = Column(Text, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReadModelStatus(Base):
+    __tablename__ = "read_model_status"
+
+    name = Column(String, primary_key=True)
+    rebuilt_at = Column(DateTime, nullable=True)
@@ -0,0 +1,202 @@
+import argparse
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+from app import models, schema
+from app.core.config import ORDER_READ_MODEL_BATCH_SIZE, ORDER_READ_MODEL_ENABLED
+from app.database import SessionLocal, engine, Base
+
+# Denormalized order documents: one row per order holding the serialized
+# schema.Order, refreshed in the same transaction as the write that changed it.
+
+STALE_ORDERS_KEY = "stale_order_ids"
+STALE_ITEMS_KEY = "stale_item_ids"
+ORDER_READ_MODEL_NAME = "orders"
+
+
+def mark_orders_stale(db: Session, order_ids):
+    db.info.setdefault(STALE_ORDERS_KEY, set()).update(i for i in order_ids if i is not None)
+
+
+def mark_items_stale(db: Session, item_ids):
+    db.info.setdefault(STALE_ITEMS_KEY, set()).update(i for i in item_ids if i is not None)
+
+
+def build_order_document(order: models.Order) -> str:
+    return schema.from_orm(schema.Order, order).json()
+
+
+def order_total(order: models.Order) -> int:
+    return sum(item.price or 0 for item in order.items)
+
+
+def refresh_order_read_models(db: Session, order_ids):
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+
+    # Serialize concurrent refreshes of the same order: under READ COMMITTED the
+    # query below then sees every item committed by the writer that held the
+    # lock before us. NO KEY UPDATE still lets other writers insert items.
+    db.query(models.Order.id).filter(models.Order.id.in_(order_ids)).order_by(models.Order.id).with_for_update(
+        key_share=True
+    ).all()
+    orders = (
+        db.query(models.Order)
+        .options(joinedload(models.Order.items).joinedload(models.OrderedItem.parameters))
+        .filter(models.Order.id.in_(order_ids))
+        .populate_existing()
+        .all()
+    )
+    existing = {
+        row.order_id: row
+        for row in db.query(models.OrderReadModel).filter(models.OrderReadModel.order_id.in_(order_ids))
+    }
+
+    now = datetime.utcnow()
+    for order in orders:
+        row = existing.get(order.id)
+        if row is None:
+            row = models.OrderReadModel(order_id=order.id)
+            db.add(row)
+        row.customer_id = order.customer_id
+        row.document = build_order_document(order)
+        row.total = order_total(order)
+        row.refreshed_at = now
+
+    missing = order_ids - {order.id for order in orders}
+    if missing:
+        db.query(models.OrderReadModel).filter(
+            models.OrderReadModel.order_id.in_(missing)
+        ).delete(synchronize_session=False)
+
+
+def _collect_stale_orders(db: Session, flush_context):
+    for obj in chain(db.new, db.dirty, db.deleted):
+        if isinstance(obj, models.Order):
+            mark_orders_stale(db, [obj.id])
+        elif isinstance(obj, models.OrderedItem):
+            previous = inspect(obj).attrs.order_id.history.deleted or []
+            mark_orders_stale(db, [obj.order_id, *previous])
+        elif isinstance(obj, models.SubsectionParameter):
+            mark_items_stale(db, [obj.item_id])
+
+
+def _refresh_stale_orders(db: Session):
+    db.flush()
+    order_ids = db.info.pop(STALE_ORDERS_KEY, set())
+    item_ids = db.info.pop(STALE_ITEMS_KEY, set())
+    if item_ids:
+        order_ids |= {
+            order_id
+            for (order_id,) in db.query(models.OrderedItem.order_id).filter(models.OrderedItem.id.in_(item_ids))
+            if order_id is not None
+        }
+    refresh_order_read_models(db, order_ids)
+
+
+def _discard_stale_orders(db: Session):
+    db.info.pop(STALE_ORDERS_KEY, None)
+    db.info.pop(STALE_ITEMS_KEY, None)
+
+
+LISTENERS = (
+    ("after_flush", _collect_stale_orders),
+    ("before_commit", _refresh_stale_orders),
+    ("after_rollback", _discard_stale_orders),
+)
+
+
+def register_listeners():
+    for name, listener in LISTENERS:
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+def remove_listeners():
+    for name, listener in LISTENERS:
+        if event.contains(Session, name, listener):
+            event.remove(Session, name, listener)
+
+
+if ORDER_READ_MODEL_ENABLED:
+    register_listeners()
+
+# The read model only serves requests once a full rebuild has completed; a
+# process that runs with the feature off cannot keep it current, so it clears
+# the marker (see invalidate()) and the next rebuild sets it again. The marker
+# is read on every check so other processes see that immediately.
+def is_ready(db: Session) -> bool:
+    rebuilt_at = (
+        db.query(models.ReadModelStatus.rebuilt_at)
+        .filter(models.ReadModelStatus.name == ORDER_READ_MODEL_NAME)
+        .scalar()
+    )
+    return rebuilt_at is not None
+
+
+def set_rebuilt(db: Session, rebuilt_at):
+    status = db.get(models.ReadModelStatus, ORDER_READ_MODEL_NAME)
+    if status is None:
+        status = models.ReadModelStatus(name=ORDER_READ_MODEL_NAME)
+        db.add(status)
+    status.rebuilt_at = rebuilt_at
+
+
+def invalidate(db: Session):
+    set_rebuilt(db, None)
+    db.commit()
+
+
+def get_order_document(db: Session, order_id: int):
+    return (
+        db.query(models.OrderReadModel.document)
+        .filter(models.OrderReadModel.order_id == order_id)
+        .scalar()
+    )
+
+
+def get_order_documents(db: Session):
+    return [
+        document
+        for (document,) in db.query(models.OrderReadModel.document).order_by(models.OrderReadModel.order_id)
+    ]
+
+
+def rebuild(batch_size: int = ORDER_READ_MODEL_BATCH_SIZE):
+    db = SessionLocal()
+    try:
+        invalidate(db)
+        started_at = datetime.utcnow()
+        last_id, rebuilt = 0, 0
+        while True:
+            order_ids = [
+                order_id
+                for (order_id,) in db.query(models.Order.id)
+                .filter(models.Order.id > last_id)
+                .order_by(models.Order.id)
+                .limit(batch_size)
+            ]
+            if not order_ids:
+                break
+            refresh_order_read_models(db, order_ids)
+            db.commit()
+            db.expunge_all()
+            last_id = order_ids[-1]
+            rebuilt += len(order_ids)
+            print(f"rebuilt {rebuilt} orders (last id {last_id})")
+        # Writes made during the rebuild are only tracked by processes running
+        # with the feature enabled; rebuilt_at records where the pass started.
+        set_rebuilt(db, started_at)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the denormalized order read model")
+    parser.add_argument("--batch-size", type=int, default=ORDER_READ_MODEL_BATCH_SIZE)
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    rebuild(args.batch_size)
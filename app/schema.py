@@ -1,7 +1,14 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
+
+def from_orm(model, obj):
+    # Config.orm_mode is only honoured by pydantic v1; v2 needs from_attributes.
+    if hasattr(model, "model_validate"):
+        return model.model_validate(obj, from_attributes=True)
+    return model.from_orm(obj)
+
 class CommonAuditFields(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -49,6 +56,11 @@ class OrderedItemUpdate(BaseModel):
     price: Optional[int] = None
     parameters: Optional[List[SubsectionParameterCreate]] = Field(default_factory=list)
 
+class ParameterPatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace"]
+    path: Optional[str] = None
+    value: Optional[SubsectionParameterCreate] = None
+
 class OrderedItem(OrderedItemBase, CommonAuditFields):
     id: int
     order_id: Optional[int] = None
@@ -105,3 +117,9 @@ class Customer(CustomerBase, CommonAuditFields):
 
     class Config:
         orm_mode = True
+
+
+class ProfilingStart(BaseModel):
+    seconds: Optional[float] = None
+    route: Optional[str] = None
+    requests: Optional[int] = None
@@ -0,0 +1,66 @@
+import argparse
+from sqlalchemy import inspect, text
+from app import models
+from app.database import engine, Base
+
+# create_all() only creates missing tables, so column defaults introduced
+# later have to be applied to existing databases here. Defaults that are
+# already in place are skipped: each ALTER TABLE takes an ACCESS EXCLUSIVE
+# lock, which must not happen on every boot.
+
+AUDIT_TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+
+def audit_tables():
+    return [
+        mapper.local_table
+        for mapper in Base.registry.mappers
+        if issubclass(mapper.class_, models.CommonBase)
+    ]
+
+
+def current_column_defaults(bind=engine):
+    # {table: {column: default expression or None}} for the audit tables that exist.
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    return {
+        table.name: {column["name"]: column.get("default") for column in inspector.get_columns(table.name)}
+        for table in audit_tables()
+        if table.name in existing_tables
+    }
+
+
+def audit_default_statements(column_defaults, backfill: bool = True):
+    statements = []
+    for table in audit_tables():
+        if table.name not in column_defaults:
+            continue
+        for column_name in AUDIT_TIMESTAMP_COLUMNS:
+            default = table.c[column_name].server_default.arg.text
+            if column_defaults[table.name].get(column_name) is None:
+                statements.append(f'ALTER TABLE "{table.name}" ALTER COLUMN "{column_name}" SET DEFAULT {default}')
+            if backfill:
+                statements.append(
+                    f'UPDATE "{table.name}" SET "{column_name}" = {default} WHERE "{column_name}" IS NULL'
+                )
+    return statements
+
+
+def apply_audit_defaults(bind=engine, backfill: bool = True):
+    if bind.dialect.name != "postgresql":
+        return []
+    statements = audit_default_statements(current_column_defaults(bind), backfill)
+    if not statements:
+        return statements
+    with bind.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    return statements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply column defaults that create_all does not add to existing tables")
+    parser.add_argument("--no-backfill", action="store_true", help="leave rows that already have NULL timestamps")
+    args = parser.parse_args()
+    for statement in apply_audit_defaults(backfill=not args.no_backfill):
+        print(statement)
@@ -0,0 +1,66 @@
+# Compares payload size and encode time of the list-endpoint wire formats.
+# Run from the repository root: python -m benchmarks.wire_formats [orders]
+import gzip
+import sys
+import time
+from datetime import datetime
+
+from app.core import wire
+
+AUDIT = {
+    "created_at": datetime(2024, 1, 1, 12, 0, 0),
+    "updated_at": datetime(2024, 1, 2, 12, 0, 0),
+    "creation_channel": "api",
+    "update_channel": "api",
+    "created_by": "admin",
+    "updated_by": "admin",
+}
+
+
+def make_orders(count: int):
+    orders = []
+    for order_id in range(1, count + 1):
+        items = []
+        for n in range(3):
+            item_id = order_id * 10 + n
+            items.append({
+                "item_name": f"item-{n}",
+                "description": "standard item",
+                "price": 100 + n,
+                "id": item_id,
+                "order_id": order_id,
+                "parameters": [
+                    {"parameter_name": f"param-{p}", "id": item_id * 10 + p, "item_id": item_id, **AUDIT}
+                    for p in range(2)
+                ],
+                **AUDIT,
+            })
+        orders.append({"status": "pending", "id": order_id, "customer_id": 1, "items": items, **AUDIT})
+    return orders
+
+
+def measure(rows, media_type, include_audit):
+    started = time.perf_counter()
+    body = wire.encode(rows if include_audit else wire.strip_audit(rows), media_type)
+    encode_ms = (time.perf_counter() - started) * 1000
+    results = {"raw": len(body), "gzip": len(gzip.compress(body))}
+    if wire.zstandard is not None:
+        results["zstd"] = len(wire.zstandard.ZstdCompressor().compress(body))
+    return encode_ms, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = make_orders(count)
+    media_types = [wire.JSON, wire.COMPACT_JSON] + ([wire.MSGPACK] if wire.msgpack is not None else [])
+    print(f"{count} orders")
+    print(f"{'format':<32}{'audit':<7}{'encode ms':>10}  sizes (bytes)")
+    for media_type in media_types:
+        for include_audit in (True, False):
+            encode_ms, sizes = measure(rows, media_type, include_audit)
+            sizes_text = "  ".join(f"{name}={size}" for name, size in sizes.items())
+            print(f"{media_type:<32}{str(include_audit):<7}{encode_ms:>10.1f}  {sizes_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+from datetime import datetime
+
+# The app binds its engine at import time; point it at a throwaway SQLite file
+# before anything under app/ is imported.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+from sqlalchemy import BigInteger, event
+from sqlalchemy.ext.compiler import compiles
+
+from app.database import engine
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_as_rowid(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns.
+    return "INTEGER"
+
+
+@event.listens_for(engine, "connect")
+def _postgres_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function("now", 0, lambda: datetime.utcnow().isoformat(" "))
+    dbapi_connection.create_function("timezone", 2, lambda zone, value: value)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
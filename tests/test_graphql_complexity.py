@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+
+import pytest
+from graphql import parse
+
+from app.core.config import GRAPHQL_MAX_COMPLEXITY
+from app.graphql import main as graphql_main
+from app.graphql.complexity import operation_cost
+from app.graphql.schema import schema_graphql
+
+
+def cost(query, variables=None):
+    return operation_cost(parse(query), schema_graphql._schema, variables)
+
+
+def execute(query, variables=None):
+    return asyncio.run(schema_graphql.execute(query, variable_values=variables))
+
+
+@pytest.mark.parametrize("query", [
+    "{ orders { id items { id parameters { id parameterName } } } }",
+    "{ orders(limit: 100) { id items { id parameters { id parameterName } } } }",
+    "{ ordersConnection { edges { node { id items { id parameters { id } } } } pageInfo { hasNextPage } } }",
+    "{ ordersConnection(first: 100) { edges { node { id items { id parameters { id } } } } } }",
+    "{ customers { id orders { id items { id parameters { id } } } } }",
+])
+def test_normal_queries_are_accepted(query):
+    assert cost(query) <= GRAPHQL_MAX_COMPLEXITY
+    assert execute(query).errors is None
+
+
+def test_connection_first_reaches_edges():
+    query = "{ ordersConnection(first: %d) { edges { node { id } } } }"
+    assert cost(query % 10) < cost(query % 50)
+
+
+def test_page_size_variables_are_resolved():
+    query = "query($n: Int) { ordersConnection(first: $n) { edges { node { id } } } }"
+    assert cost(query, {"n": 100}) == cost("{ ordersConnection(first: 100) { edges { node { id } } } }")
+    with_default = "query($n: Int = 100) { orders(limit: $n) { id } }"
+    assert cost(with_default) == cost("{ orders(limit: 100) { id } }")
+
+
+def test_page_size_is_capped():
+    assert cost("{ orders(limit: 100000) { id } }") == cost("{ orders(limit: 100) { id } }")
+
+
+def test_expensive_query_is_rejected():
+    query = "query($n: Int) { customers(limit: $n) { id orders { id items { id parameters { id } } } } }"
+    result = execute(query, {"n": 100})
+    assert result.errors
+    assert "maximum complexity" in result.errors[0].message
+
+
+def persisted_request(query=None, query_hash=None):
+    query_hash = query_hash or hashlib.sha256(query.encode()).hexdigest()
+    return graphql_main.PersistedQueryRequest(
+        query=query, extensions={"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+    )
+
+
+def test_persisted_query_handshake():
+    query = "{ orders { id } }"
+    query_hash = hashlib.sha256(query.encode()).hexdigest()
+
+    _, error = graphql_main.resolve_persisted_query(persisted_request(query_hash=query_hash))
+    assert error["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    resolved, error = graphql_main.resolve_persisted_query(persisted_request(query))
+    assert error is None and resolved == query
+
+    resolved, error = graphql_main.resolve_persisted_query(persisted_request(query_hash=query_hash))
+    assert error is None and resolved == query
+
+
+def test_persisted_query_hash_mismatch_is_rejected():
+    _, error = graphql_main.resolve_persisted_query(persisted_request("{ orders { id } }", query_hash="0" * 64))
+    assert error["errors"][0]["extensions"]["code"] == "INVALID_PERSISTED_QUERY_HASH"
+
+
+def test_persisted_query_cache_is_bounded():
+    cache = graphql_main.PersistedQueryCache(maxsize=2)
+    for n in range(3):
+        cache.put(str(n), f"query {n}")
+    assert len(cache) == 2
+    assert cache.get("0") is None
+    assert cache.get("2") == "query 2"
+
+
+def create_items_query(count, parameters=0):
+    items = ", ".join(
+        '{itemName: "x", price: 1, orderId: 1, parameters: [%s]}' % ", ".join(['{parameterName: "p"}'] * parameters)
+        for _ in range(count)
+    )
+    return "mutation { createItems(items: [%s]) { id parameters { id } } }" % items
+
+
+def test_list_arguments_are_priced():
+    assert cost(create_items_query(100)) > cost(create_items_query(10)) + 90
+    assert cost(create_items_query(10, parameters=5)) > cost(create_items_query(10))
+    query = "mutation($items: [OrderedItemInput!]!) { createItems(items: $items) { id } }"
+    items = [{"itemName": "x", "price": 1, "orderId": 1}] * 5000
+    assert cost(query, {"items": items}) > GRAPHQL_MAX_COMPLEXITY
+
+
+def test_batch_size_is_capped(monkeypatch):
+    monkeypatch.setattr("app.graphql.schema.GRAPHQL_MAX_BATCH_SIZE", 2)
+    query = "mutation($updates: [OrderStatusInput!]!) { updateOrderStatuses(updates: $updates) { id } }"
+    result = execute(query, {"updates": [{"orderId": i, "status": "shipped"} for i in range(3)]})
+    assert result.errors
+    assert "At most 2 updates" in result.errors[0].message
+
+
+def test_mistyped_page_size_is_reported_by_graphql():
+    query = "query($n: Int) { ordersConnection(first: $n) { edges { node { id } } } }"
+    result = execute(query, {"n": "abc"})
+    assert result.errors
+    assert "invalid literal" not in result.errors[0].message
+    assert "$n" in result.errors[0].message
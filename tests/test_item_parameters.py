@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import crud, schema
+
+
+def param(id, name):
+    return SimpleNamespace(id=id, parameter_name=name)
+
+
+def op(op, path=None, name=None):
+    value = schema.SubsectionParameterCreate(parameter_name=name) if name else None
+    return schema.ParameterPatchOperation(op=op, path=path, value=value)
+
+
+def test_diff_keeps_unchanged_rows():
+    inserts, deletes, unchanged = crud.diff_parameters([param(1, "a"), param(2, "b")], ["a", "b"])
+    assert (inserts, deletes, unchanged) == ([], [], [1, 2])
+
+
+def test_diff_does_not_reuse_removed_rows():
+    inserts, deletes, unchanged = crud.diff_parameters([param(1, "a"), param(2, "b")], ["a", "c"])
+    assert inserts == ["c"]
+    assert deletes == [2]
+    assert unchanged == [1]
+
+
+def test_diff_handles_duplicate_names():
+    existing = [param(1, "a"), param(2, "a"), param(3, "b")]
+    inserts, deletes, unchanged = crud.diff_parameters(existing, ["a", "b", "b"])
+    assert inserts == ["b"]
+    assert deletes == [2]
+    assert unchanged == [1, 3]
+
+
+def test_plan_patch_operations():
+    inserts, deletes, renames = crud.plan_parameter_patch(
+        7, {1, 2, 3}, [op("add", name="x"), op("remove", "/1"), op("replace", "/2", "y")]
+    )
+    assert (inserts, deletes, renames) == (["x"], [1], {2: "y"})
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([op("add")], "'add' requires a value"),
+    ([op("remove", "/abc")], "Invalid parameter path"),
+    ([op("remove")], "Invalid parameter path"),
+    ([op("remove", "/99")], "Parameter 99 not found on item 7"),
+    ([op("replace", "/1")], "'replace' requires a value"),
+    ([op("remove", "/1"), op("replace", "/1", "y")], "Parameter 1 not found on item 7"),
+])
+def test_plan_patch_rejects_invalid_operations(operations, message):
+    with pytest.raises(ValueError, match=message):
+        crud.plan_parameter_patch(7, {1, 2}, operations)
+
+
+@pytest.fixture
+def item(client):
+    customer = client.post("/customers", json={"name": "c", "email": f"c{id(client)}@example.com"}).json()
+    order = client.post("/orders", json={"customer_id": customer["id"]}).json()
+    return client.post("/items", json={
+        "item_name": "widget",
+        "price": 10,
+        "order_id": order["id"],
+        "parameters": [{"parameter_name": "a"}, {"parameter_name": "b"}],
+    }).json()
+
+
+def test_put_item_keeps_unchanged_parameter_ids(client, item):
+    ids = {p["parameter_name"]: p["id"] for p in item["parameters"]}
+    response = client.put(f"/items/{item['id']}", json={"parameters": [{"parameter_name": "b"}, {"parameter_name": "c"}]})
+    assert response.status_code == 200
+    params = {p["parameter_name"]: p for p in response.json()["parameters"]}
+    assert set(params) == {"b", "c"}
+    assert params["b"]["id"] == ids["b"]
+    assert params["c"]["id"] not in ids.values()
+    assert params["c"]["created_by"] == "admin"
+
+
+def test_patch_parameters(client, item):
+    first, second = item["parameters"]
+    response = client.patch(f"/items/{item['id']}/parameters", json=[
+        {"op": "remove", "path": f"/{first['id']}"},
+        {"op": "replace", "path": f"/{second['id']}", "value": {"parameter_name": "renamed"}},
+        {"op": "add", "value": {"parameter_name": "new"}},
+    ])
+    assert response.status_code == 200
+    names = {p["id"]: p["parameter_name"] for p in response.json()["parameters"]}
+    assert names[second["id"]] == "renamed"
+    assert first["id"] not in names
+    assert "new" in names.values()
+
+
+def test_patch_unknown_item_is_404(client):
+    response = client.patch("/items/999999/parameters", json=[{"op": "add", "value": {"parameter_name": "x"}}])
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "remove", "path": "/999999"},
+    {"op": "remove", "path": "/not-an-id"},
+    {"op": "add"},
+])
+def test_patch_invalid_operation_is_400_and_rolled_back(client, item, operation):
+    response = client.patch(f"/items/{item['id']}/parameters", json=[
+        {"op": "add", "value": {"parameter_name": "should-not-persist"}},
+        operation,
+    ])
+    assert response.status_code == 400
+    params = client.get(f"/items/{item['id']}").json()["parameters"]
+    assert [p["parameter_name"] for p in params] == ["a", "b"]
+
+
+def test_patch_unknown_op_is_422(client, item):
+    response = client.patch(f"/items/{item['id']}/parameters", json=[{"op": "move", "path": "/1"}])
+    assert response.status_code == 422
@@ -0,0 +1,94 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.security import create_access_token
+
+ADMIN = {"Authorization": f"Bearer {create_access_token({'sub': 'ops', 'role': 'admin'})}"}
+
+
+def busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def matching_endpoint_work():
+    busy(0.2)
+
+
+def unrelated_background_work(stop):
+    while not stop.is_set():
+        busy(0.01)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    profiling.install(app)
+
+    @app.get("/slow")
+    def slow():
+        matching_endpoint_work()
+        return {"ok": True}
+
+    @app.get("/fast")
+    def fast():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_request_mode_samples_only_matching_request_threads(client):
+    stop = threading.Event()
+    background = threading.Thread(target=unrelated_background_work, args=(stop,))
+    background.start()
+    try:
+        profiling.sampler.start(route="/slow", requests=1)
+        client.get("/fast")
+        client.get("/slow")
+    finally:
+        stop.set()
+        background.join()
+    stacks = profiling.sampler.collapsed()
+    assert "matching_endpoint_work" in stacks
+    assert "unrelated_background_work" not in stacks
+    summary = profiling.sampler.summary()
+    assert summary["remaining_requests"] == 0
+    assert summary["samples"] > 0
+
+
+def test_profiled_request_returns_profile_id(client):
+    response = client.get("/slow", headers={**ADMIN, "X-Profile": "1"})
+    assert response.status_code == 200
+    report = profiling.request_profiles[response.headers["X-Profile-Id"]]
+    assert "matching_endpoint_work" in report
+
+
+def test_profile_header_requires_admin(client):
+    response = client.get("/fast", headers={"X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_overlapping_profiled_request_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(profiling, "_profile_lock", SimpleNamespace(locked=lambda: True))
+    response = client.get("/fast", headers={**ADMIN, "X-Profile": "1"})
+    assert response.status_code == 409
+
+
+def test_admin_surface_is_disabled_with_default_secret(client, monkeypatch):
+    from app import main
+    from app.core import security
+
+    monkeypatch.setattr(security, "SECRET_KEY", security.DEFAULT_SECRET_KEY)
+    forged = {"Authorization": f"Bearer {create_access_token({'sub': 'x', 'role': 'admin'})}"}
+    response = client.get("/fast", headers={**forged, "X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+    admin_response = TestClient(main.app).get("/admin/profiling", headers=forged)
+    assert admin_response.status_code == 403
+    assert "SECRET_KEY" in admin_response.json()["detail"]
@@ -0,0 +1,95 @@
+import pytest
+
+from app import main, models, read_model
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(main, "ORDER_READ_MODEL_ENABLED", True)
+    read_model.register_listeners()
+    with SessionLocal() as db:
+        read_model.invalidate(db)
+    yield
+    read_model.remove_listeners()
+    with SessionLocal() as db:
+        read_model.invalidate(db)
+
+
+def create_order(client):
+    customer = client.post("/customers", json={"name": "r", "email": f"r{id(object())}@example.com"}).json()
+    order = client.post("/orders", json={"customer_id": customer["id"]}).json()
+    client.post("/items", json={"item_name": "i", "price": 5, "order_id": order["id"], "parameters": [{"parameter_name": "p"}]})
+    return order
+
+
+def read_model_ids():
+    with SessionLocal() as db:
+        return {order_id for (order_id,) in db.query(models.OrderReadModel.order_id)}
+
+
+def test_listeners_are_not_registered_when_disabled():
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    assert not event.contains(Session, "after_flush", read_model._collect_stale_orders)
+
+
+def test_list_falls_back_until_rebuilt(client, enabled):
+    with SessionLocal() as db:
+        db.query(models.OrderReadModel).delete()
+        db.commit()
+    # Written while the feature was off: no read-model row exists.
+    read_model.remove_listeners()
+    untracked = create_order(client)
+    read_model.register_listeners()
+
+    ids = [order["id"] for order in client.get("/orders").json()]
+    assert untracked["id"] in ids
+    assert untracked["id"] not in read_model_ids()
+
+    read_model.rebuild(batch_size=2)
+    assert untracked["id"] in read_model_ids()
+    served = client.get("/orders").json()
+    assert untracked["id"] in [order["id"] for order in served]
+
+
+def test_writes_keep_rows_current(client, enabled):
+    read_model.rebuild()
+    order = create_order(client)
+    document = client.get(f"/orders/{order['id']}").json()
+    assert [item["item_name"] for item in document["items"]] == ["i"]
+
+    client.put(f"/orders/{order['id']}/status", json={"status": "shipped"})
+    assert client.get(f"/orders/{order['id']}").json()["status"] == "shipped"
+
+    client.delete(f"/orders/{order['id']}")
+    assert order["id"] not in read_model_ids()
+
+
+def test_invalidate_is_seen_by_serving_sessions(client, enabled):
+    read_model.rebuild()
+    with SessionLocal() as serving:
+        assert read_model.is_ready(serving)
+        with SessionLocal() as other:
+            read_model.invalidate(other)
+        assert not read_model.is_ready(serving)
+
+
+def test_refresh_locks_orders_before_reading(client, enabled):
+    from sqlalchemy import event
+    from sqlalchemy.dialects import postgresql
+
+    order = create_order(client)
+    statements = []
+
+    def record(state):
+        statements.append(str(state.statement.compile(dialect=postgresql.dialect())))
+
+    # SQLite drops FOR UPDATE, so check the Postgres form of what was issued.
+    with SessionLocal() as db:
+        event.listen(db, "do_orm_execute", record)
+        read_model.refresh_order_read_models(db, [order["id"]])
+        db.rollback()
+    assert statements[0].endswith("FOR NO KEY UPDATE")
+    assert "JOIN" not in statements[0]
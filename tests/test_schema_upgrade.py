@@ -0,0 +1,41 @@
+from app import schema_upgrade
+
+
+def test_audit_tables_cover_every_common_base_model():
+    names = {table.name for table in schema_upgrade.audit_tables()}
+    assert names == {"customers", "orders", "ordered_items", "subsection_parameters"}
+
+
+def test_statements_set_defaults_and_backfill():
+    statements = schema_upgrade.audit_default_statements({"orders": {"created_at": None, "updated_at": None}})
+    assert statements == [
+        """ALTER TABLE "orders" ALTER COLUMN "created_at" SET DEFAULT timezone('utc', now())""",
+        """UPDATE "orders" SET "created_at" = timezone('utc', now()) WHERE "created_at" IS NULL""",
+        """ALTER TABLE "orders" ALTER COLUMN "updated_at" SET DEFAULT timezone('utc', now())""",
+        """UPDATE "orders" SET "updated_at" = timezone('utc', now()) WHERE "updated_at" IS NULL""",
+    ]
+
+
+def test_missing_tables_are_skipped_and_backfill_is_optional():
+    assert schema_upgrade.audit_default_statements({}) == []
+    missing = {"created_at": None, "updated_at": None}
+    statements = schema_upgrade.audit_default_statements({"customers": missing, "orders": missing}, backfill=False)
+    assert len(statements) == 4
+    assert all(statement.startswith("ALTER TABLE") for statement in statements)
+
+
+def test_existing_defaults_are_not_altered_again():
+    from app.database import engine
+
+    column_defaults = schema_upgrade.current_column_defaults(engine)
+    assert set(column_defaults) == {"customers", "orders", "ordered_items", "subsection_parameters"}
+    assert column_defaults["orders"]["created_at"] is not None
+    assert schema_upgrade.audit_default_statements(column_defaults, backfill=False) == []
+    statements = schema_upgrade.audit_default_statements(column_defaults)
+    assert statements and all(statement.startswith("UPDATE") for statement in statements)
+
+
+def test_non_postgres_databases_are_left_alone():
+    from app.database import engine
+
+    assert schema_upgrade.apply_audit_defaults(engine) == []
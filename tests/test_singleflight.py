@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.singleflight import AsyncSingleFlight, SingleFlight, SingleFlightTimeout
+from app.graphql import schema as graphql_schema
+
+
+def test_threads_share_one_fetch():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return "body"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", fetch))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["body"] * 10
+    assert len(calls) == 1
+    assert flight.stats()["collapse_ratio"] == 10
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_async_waiters_share_one_fetch():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(20)))
+
+    assert run(main()) == [{"id": 1}] * 20
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 19
+
+
+def test_async_waiter_queue_is_bounded():
+    flight = AsyncSingleFlight(max_waiters=2)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 1
+
+    async def main():
+        await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+
+    run(main())
+    assert len(calls) == 3
+    assert flight.stats()["overflow"] == 2
+
+
+def test_async_waiters_time_out():
+    flight = AsyncSingleFlight(timeout=0.01)
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return 1
+
+    async def main():
+        return await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch), return_exceptions=True)
+
+    leader, waiter = run(main())
+    assert leader == 1
+    assert isinstance(waiter, SingleFlightTimeout)
+
+
+def test_async_errors_reach_every_waiter():
+    flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in run(main()))
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_graphql_lookups_are_coalesced(monkeypatch):
+    calls = []
+
+    def fetch_orders(id, limit):
+        calls.append(threading.current_thread())
+        time.sleep(0.05)
+        return [{"id": id, "status": "pending", "customer_id": 1, "items": [
+            {"id": 2, "item_name": "i", "description": None, "price": 1, "parameters": [{"id": 3, "parameter_name": "p"}]},
+        ]}]
+
+    monkeypatch.setattr(graphql_schema, "fetch_orders", fetch_orders)
+    query = "{ orders(id: 1) { id items { parameters { parameterName } } } }"
+
+    async def main():
+        return await asyncio.gather(*(graphql_schema.schema_graphql.execute(query) for _ in range(5)))
+
+    results = run(main())
+    assert all(result.errors is None for result in results)
+    assert all(result.data["orders"][0]["items"][0]["parameters"][0]["parameterName"] == "p" for result in results)
+    assert len(calls) == 1
+    assert calls[0] is not threading.main_thread()
+
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    flight = AsyncSingleFlight(timeout=1.0)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        started = time.monotonic()
+        result = await waiter
+        return result, time.monotonic() - started, leader.cancelled()
+
+    result, waited, leader_cancelled = run(main())
+    assert leader_cancelled
+    assert result == 2
+    assert waited < 0.5
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_rest_herd_uses_one_worker_thread(monkeypatch):
+    from app import main as rest
+    from app.core import singleflight
+
+    monkeypatch.setattr(singleflight, "reads", AsyncSingleFlight())
+    threads = set()
+
+    def fetch():
+        threads.add(threading.current_thread())
+        time.sleep(0.05)
+        return "{}"
+
+    async def herd():
+        return await asyncio.gather(*(rest.coalesced_read(("order", 1), fetch) for _ in range(200)))
+
+    assert run(herd()) == ["{}"] * 200
+    assert len(threads) == 1
+    assert singleflight.reads.stats()["coalesced"] == 199
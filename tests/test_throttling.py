@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core import throttling
+from app.core.security import create_access_token
+from app.database import engine
+
+
+def make_request(method="GET", path="/orders", headers=None, body=b"", query_string=b""):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("10.0.0.1", 1234),
+    }
+    return Request(scope, receive)
+
+
+@pytest.fixture
+def limited_client(monkeypatch):
+    monkeypatch.setattr(throttling, "RATE_LIMIT_BURST", 5)
+    monkeypatch.setattr(throttling, "RATE_LIMIT_PER_SECOND", 1.0)
+    app = FastAPI()
+    throttling.install(app, engine, throttling.InMemoryTokenBucketStore())
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_spoofed_api_keys_share_the_client_bucket(limited_client):
+    statuses = [limited_client.get("/ping", headers={"X-API-Key": str(n)}).status_code for n in range(10)]
+    assert statuses.count(429) == 5
+
+
+def test_verified_token_gets_its_own_bucket(limited_client):
+    for _ in range(5):
+        limited_client.get("/ping")
+    assert limited_client.get("/ping").status_code == 429
+    token = create_access_token({"sub": "alice"})
+    response = limited_client.get("/ping", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert int(limited_client.get("/ping").headers["Retry-After"]) >= 1
+
+
+def test_forged_tokens_share_the_client_bucket(limited_client):
+    from jose import jwt
+    from app.core.config import ALGORITHM, DEFAULT_SECRET_KEY
+
+    statuses = [
+        limited_client.get(
+            "/ping",
+            headers={"Authorization": f"Bearer {jwt.encode({'sub': str(n)}, DEFAULT_SECRET_KEY, algorithm=ALGORITHM)}"},
+        ).status_code
+        for n in range(30)
+    ]
+    assert statuses.count(429) == 25
+
+
+def test_tokens_are_ignored_with_the_default_secret(monkeypatch):
+    from app.core import security
+
+    token = create_access_token({"sub": "alice"})
+    monkeypatch.setattr(security, "SECRET_KEY", security.DEFAULT_SECRET_KEY)
+    request = make_request(headers={"Authorization": f"Bearer {token}"})
+    assert throttling.client_key(request) == "ip:10.0.0.1"
+
+
+def test_invalid_token_falls_back_to_address():
+    request = make_request(headers={"Authorization": "Bearer not-a-token"})
+    assert throttling.client_key(request) == "ip:10.0.0.1"
+
+
+def test_idle_buckets_are_evicted(monkeypatch):
+    store = throttling.InMemoryTokenBucketStore()
+    clock = [1000.0]
+    monkeypatch.setattr(throttling.time, "monotonic", lambda: clock[0])
+    for n in range(50):
+        store.take(f"ip:{n}", rate=10.0, capacity=10)
+    assert len(store) == 50
+    clock[0] += 2
+    store.take("ip:new", rate=10.0, capacity=10)
+    assert len(store) == 1
+
+
+def test_bucket_count_is_capped():
+    store = throttling.InMemoryTokenBucketStore(max_buckets=10)
+    for n in range(100):
+        store.take(f"ip:{n}", rate=1.0, capacity=10)
+    assert len(store) == 10
+
+
+@pytest.mark.parametrize("request_kwargs, expected", [
+    ({"path": "/orders/1"}, "cheap"),
+    ({"path": "/orders"}, "expensive"),
+    ({"method": "POST", "path": "/orders"}, "write"),
+    ({"method": "POST", "path": "/graphql", "body": json.dumps({"query": "{ orders { id } }"}).encode()}, "expensive"),
+    ({"method": "POST", "path": "/graphql",
+      "body": json.dumps({"query": "mutation { deleteOrder(orderId: 1) }"}).encode()}, "write"),
+    ({"method": "POST", "path": "/graphql", "body": json.dumps({
+        "query": "query Q { orders { id } } mutation M { deleteOrder(orderId: 1) }",
+        "operationName": "M",
+    }).encode()}, "write"),
+    ({"path": "/graphql", "query_string": b"query=%7B%20orders%20%7B%20id%20%7D%20%7D"}, "expensive"),
+])
+def test_classify(request_kwargs, expected):
+    assert asyncio.run(throttling.classify(make_request(**request_kwargs))) == expected
@@ -0,0 +1,123 @@
+import asyncio
+import gzip
+import json
+
+from fastapi.responses import StreamingResponse
+from starlette.requests import Request
+
+from app.core import wire
+
+
+def make_request(headers=None):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/items",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    return Request(scope)
+
+
+def read_body(response):
+    if not isinstance(response, StreamingResponse):
+        return response.body
+
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(collect())
+
+
+def make_items(count, parameters=3):
+    return [
+        {
+            "id": i,
+            "name": f"item-{i}",
+            "created_at": "2024-01-01T00:00:00",
+            "parameters": [{"id": i * 10 + p, "name": f"p{p}", "created_at": "2024-01-01T00:00:00"}
+                           for p in range(parameters)],
+        }
+        for i in range(count)
+    ]
+
+
+def test_parse_header_reads_q_values():
+    assert wire.parse_header("a;q=0.5, b, c ; q=0") == {"a": 0.5, "b": 1.0, "c": 0.0}
+
+
+def test_media_type_respects_q_zero():
+    request = make_request({"accept": "application/msgpack;q=0, application/json"})
+    assert wire.choose_media_type(request) == wire.JSON
+
+
+def test_media_type_prefers_higher_q():
+    request = make_request({"accept": "application/json, application/vnd.compact+json;q=0.5"})
+    assert wire.choose_media_type(request) == wire.JSON
+    request = make_request({"accept": "application/json;q=0.5, application/vnd.compact+json"})
+    assert wire.choose_media_type(request) == wire.COMPACT_JSON
+
+
+def test_wildcard_accept_selects_json():
+    assert wire.choose_media_type(make_request({"accept": "*/*"})) == wire.JSON
+
+
+def test_specific_q_zero_beats_wildcard():
+    request = make_request({"accept": "application/json;q=0, */*"})
+    assert wire.choose_media_type(request) in (wire.MSGPACK, wire.COMPACT_JSON)
+    request = make_request({"accept": "application/msgpack;q=0, application/*"})
+    assert wire.choose_media_type(request) == wire.JSON
+    request = make_request({"accept": "application/json;q=0.2, application/*;q=0.9, application/vnd.compact+json;q=0.5"})
+    assert wire.choose_media_type(request) == (wire.MSGPACK if wire.msgpack else wire.COMPACT_JSON)
+
+
+def test_encoding_respects_q_zero():
+    request = make_request({"accept-encoding": "zstd;q=0, gzip"})
+    assert wire.choose_encoding(request) == "gzip"
+    request = make_request({"accept-encoding": "gzip;q=0, identity"})
+    assert wire.choose_encoding(request) is None
+    request = make_request({"accept-encoding": "*;q=0"})
+    assert wire.choose_encoding(request) is None
+
+
+def test_columnar_hoists_nested_columns():
+    payload = wire.to_columnar(make_items(3))
+    assert payload["columns"] == [
+        "id", "name", "created_at", {"name": "parameters", "columns": ["id", "name", "created_at"]},
+    ]
+    assert payload["rows"][1] == [
+        1, "item-1", "2024-01-01T00:00:00",
+        [[10, "p0", "2024-01-01T00:00:00"], [11, "p1", "2024-01-01T00:00:00"], [12, "p2", "2024-01-01T00:00:00"]],
+    ]
+    assert json.dumps(payload).count('"columns"') == 2
+
+
+def test_encode_chunks_matches_whole_document():
+    rows = make_items(5)
+    assert json.loads(wire.encode(rows, wire.JSON)) == rows
+    assert json.loads(wire.encode(rows, wire.COMPACT_JSON)) == wire.to_columnar(rows)
+    assert json.loads(wire.encode([], wire.COMPACT_JSON)) == {"columns": [], "rows": []}
+
+
+def test_small_body_is_not_compressed():
+    response = wire.negotiated_response(make_request({"accept-encoding": "gzip"}), make_items(1))
+    assert "content-encoding" not in response.headers
+    assert json.loads(read_body(response)) == make_items(1)
+
+
+def test_large_body_streams_compressed():
+    rows = make_items(200)
+    response = wire.negotiated_response(make_request({"accept-encoding": "gzip"}), rows, include_audit=False)
+    assert isinstance(response, StreamingResponse)
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(read_body(response))) == wire.strip_audit(rows)
+
+
+def test_json_documents_pass_through():
+    documents = [json.dumps(row) for row in make_items(2)]
+    response = wire.negotiated_response(make_request(), json_documents=documents)
+    assert json.loads(read_body(response)) == make_items(2)
+    response = wire.negotiated_response(
+        make_request({"accept": wire.COMPACT_JSON}), include_audit=False, json_documents=documents
+    )
+    assert json.loads(read_body(response)) == wire.to_columnar(wire.strip_audit(make_items(2)))